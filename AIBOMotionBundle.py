@@ -0,0 +1,269 @@
+#Compiled binary bundle of the reference tables (joints.json, conversion.json and poses/*.json).
+#Strings are interned once, lookups are stored as index triples and pose angles as contiguous int32 that are
+#mapped straight from the file. The bundle is rebuilt automatically whenever one of the sources changes.
+#Made with <3 by Doggies Galore
+
+import glob
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+import numpy as np
+
+BUNDLE_FILE = "reference.bundle"
+BUNDLE_MAGIC = b"AIBOREF\x00"
+BUNDLE_VERSION = 1
+
+JOINTS_FILE = "joints.json"
+CONVERSION_FILE = "conversion.json"
+POSES_GLOB = os.path.join("poses", "*.json")
+
+# magic, version, source fingerprint, then (offset, length) for each section in SECTIONS order.
+SECTIONS = ("string_offsets", "strings", "joints", "conversion", "pose_index", "pose_ids", "pose_angles")
+HEADER_FORMAT = "<8sI20s" + "II" * len(SECTIONS)
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+# pose_index columns: library key, model, pose count, joint count, first id in pose_ids, first angle in pose_angles
+POSE_INDEX_COLUMNS = 6
+
+
+def source_files():
+    return [JOINTS_FILE, CONVERSION_FILE] + sorted(glob.glob(POSES_GLOB))
+
+def source_fingerprint(files=None):
+    # Only stats the sources, so checking for changes doesn't cost a JSON parse.
+    digest = hashlib.sha1()
+    for path in files or source_files():
+        if os.path.exists(path):
+            stat = os.stat(path)
+            digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+        else:
+            digest.update(f"{path}:missing\n".encode())
+    return digest.digest()
+
+def load_json_source(path, default):
+    # A missing table compiles to an empty one, e.g. when a tool only needs joints.json.
+    if not os.path.exists(path):
+        return default
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+class StringTable:
+    def __init__(self):
+        self.strings = []
+        self.ids = {}
+
+    def intern(self, value):
+        string_id = self.ids.get(value)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.strings.append(value)
+            self.ids[value] = string_id
+        return string_id
+
+    def pack(self):
+        encoded = [value.encode() for value in self.strings]
+        offsets = np.zeros(len(encoded) + 1, dtype="<u4")
+        offsets[1:] = np.cumsum([len(value) for value in encoded])
+        return offsets.tobytes(), b"".join(encoded)
+
+
+def compile_bundle():
+    files = source_files()
+    fingerprint = source_fingerprint(files)
+    strings = StringTable()
+
+    joints_map = load_json_source(JOINTS_FILE, {})
+    joints = [
+        (strings.intern(model), strings.intern(prm_code), strings.intern(joint_name))
+        for model, model_joints in joints_map.items()
+        for prm_code, joint_name in model_joints.items()
+    ]
+
+    conversion_map = load_json_source(CONVERSION_FILE, {})
+    conversion = [
+        (strings.intern(movement_name), strings.intern(model), strings.intern(prm_code))
+        for movement_name, model_codes in conversion_map.items()
+        for model, prm_code in model_codes.items()
+    ]
+
+    pose_index = []
+    pose_ids = []
+    pose_angles = []
+    angle_count = 0
+    for path in files[2:]:
+        key = os.path.splitext(os.path.basename(path))[0]
+        # A broken pose library (e.g. an interrupted discovery run) is skipped so the other tables still load.
+        try:
+            poses = load_json_source(path, {"Poses": []})["Poses"]
+            joint_names = [joint["JointName"] for joint in poses[0]["JointPositions"]] if poses else []
+            angles = [int(joint["Angle_urad"]) for pose in poses for joint in pose["JointPositions"]]
+            pose_names = [pose["Pose"] for pose in poses]
+        except (ValueError, KeyError, TypeError, IndexError) as error:
+            print(f"Warning: skipping {path}, not a valid pose library: {error!r}", file=sys.stderr)
+            continue
+        if len(angles) != len(poses) * len(joint_names):
+            print(f"Warning: skipping {path}, its poses don't all have the same joints", file=sys.stderr)
+            continue
+        # Discovered libraries are saved as <model>_discovered.json
+        model = key.split("_", 1)[0]
+        pose_index.append((strings.intern(key), strings.intern(model), len(poses), len(joint_names), len(pose_ids), angle_count))
+        pose_ids.extend(strings.intern(name) for name in pose_names)
+        pose_ids.extend(strings.intern(name) for name in joint_names)
+        pose_angles.extend(angles)
+        angle_count += len(angles)
+
+    string_offsets, string_blob = strings.pack()
+    sections = [
+        string_offsets,
+        string_blob,
+        np.array(joints, dtype="<u4").reshape(-1, 3).tobytes(),
+        np.array(conversion, dtype="<u4").reshape(-1, 3).tobytes(),
+        np.array(pose_index, dtype="<u4").reshape(-1, POSE_INDEX_COLUMNS).tobytes(),
+        np.array(pose_ids, dtype="<u4").tobytes(),
+        np.array(pose_angles, dtype="<i4").tobytes(),
+    ]
+
+    # Every section starts on an 8 byte boundary so the arrays can be mapped in place.
+    layout = []
+    body = bytearray()
+    for section in sections:
+        body.extend(b'\x00' * ((8 - (HEADER_SIZE + len(body)) % 8) % 8))
+        layout.extend((HEADER_SIZE + len(body), len(section)))
+        body.extend(section)
+    return struct.pack(HEADER_FORMAT, BUNDLE_MAGIC, BUNDLE_VERSION, fingerprint, *layout) + bytes(body)
+
+def current_umask():
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+def write_file_atomically(filename, data):
+    # Written to a temporary file next to the target and renamed over it, so a reader (or another process
+    # rebuilding at the same time) never sees a half-written file. mkstemp creates files 0600, so the
+    # result gets the mode a plain open() would have given it.
+    fd, temporary = tempfile.mkstemp(prefix=os.path.basename(filename) + ".", suffix=".tmp",
+                                     dir=os.path.dirname(os.path.abspath(filename)))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(temporary, 0o666 & ~current_umask())
+        os.replace(temporary, filename)
+    except BaseException:
+        os.remove(temporary)
+        raise
+
+def build_bundle(filename=BUNDLE_FILE):
+    data = compile_bundle()
+    write_file_atomically(filename, data)
+    return data
+
+
+class Reference:
+    def __init__(self, buffer):
+        self.buffer = buffer
+        magic, version, self.fingerprint, *layout = struct.unpack_from(HEADER_FORMAT, buffer, 0)
+        if magic != BUNDLE_MAGIC or version != BUNDLE_VERSION:
+            raise ValueError("not a reference bundle of this version")
+        self.sections = {name: (layout[2 * i], layout[2 * i + 1]) for i, name in enumerate(SECTIONS)}
+
+        string_offsets = self._array("string_offsets", "<u4").tolist()
+        offset, length = self.sections["strings"]
+        blob = bytes(buffer[offset:offset + length])
+        self.strings = [blob[start:end].decode() for start, end in zip(string_offsets, string_offsets[1:])]
+
+        self._joints_map = None
+        self._conversion_map = None
+        self._conversion_prm_map = None
+        self._pose_index = {}
+        pose_index = self._array("pose_index", "<u4").reshape(-1, POSE_INDEX_COLUMNS)
+        for key_id, model_id, num_poses, num_joints, ids_start, angles_start in pose_index.tolist():
+            self._pose_index[self.strings[key_id]] = (self.strings[model_id], num_poses, num_joints, ids_start, angles_start)
+
+    def _array(self, section, dtype):
+        offset, length = self.sections[section]
+        dtype = np.dtype(dtype)
+        return np.frombuffer(self.buffer, dtype=dtype, count=length // dtype.itemsize, offset=offset)
+
+    @property
+    def joints_map(self):
+        # {model: {PRM code: movement name}}, same shape as joints.json
+        if self._joints_map is None:
+            joints_map = {}
+            strings = self.strings
+            for model_id, prm_id, name_id in self._array("joints", "<u4").reshape(-1, 3).tolist():
+                joints_map.setdefault(strings[model_id], {})[strings[prm_id]] = strings[name_id]
+            self._joints_map = joints_map
+        return self._joints_map
+
+    @property
+    def conversion_map(self):
+        # {movement name: {model: PRM code}}, same shape as conversion.json
+        if self._conversion_map is None:
+            conversion_map = {}
+            strings = self.strings
+            for name_id, model_id, prm_id in self._array("conversion", "<u4").reshape(-1, 3).tolist():
+                conversion_map.setdefault(strings[name_id], {})[strings[model_id]] = strings[prm_id]
+            self._conversion_map = conversion_map
+        return self._conversion_map
+
+    @property
+    def conversion_prm_map(self):
+        # {model: {PRM code: movement name}} reverse of conversion.json, skipping models without the movement
+        if self._conversion_prm_map is None:
+            conversion_prm_map = {}
+            for movement_name, model_codes in self.conversion_map.items():
+                for model, prm_code in model_codes.items():
+                    if prm_code != "-":
+                        conversion_prm_map.setdefault(model, {}).setdefault(prm_code, movement_name)
+            self._conversion_prm_map = conversion_prm_map
+        return self._conversion_prm_map
+
+    @property
+    def pose_keys(self):
+        return list(self._pose_index)
+
+    def pose_arrays(self, key):
+        # (pose names, joint names, poses x joints int32 view onto the bundle)
+        model, num_poses, num_joints, ids_start, angles_start = self._pose_index[key]
+        ids = self._array("pose_ids", "<u4")[ids_start:ids_start + num_poses + num_joints].tolist()
+        angles = self._array("pose_angles", "<i4")[angles_start:angles_start + num_poses * num_joints]
+        return (
+            [self.strings[i] for i in ids[:num_poses]],
+            [self.strings[i] for i in ids[num_poses:]],
+            angles.reshape(num_poses, num_joints)
+        )
+
+
+def _map_bundle(filename):
+    with open(filename, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def load_reference(filename=BUNDLE_FILE):
+    # Maps the bundle, rebuilding it first when it's missing, from another version or older than its sources.
+    fingerprint = source_fingerprint()
+    if os.path.exists(filename):
+        try:
+            reference = Reference(_map_bundle(filename))
+            if reference.fingerprint == fingerprint:
+                return reference
+        except (ValueError, struct.error, OSError):
+            pass
+    try:
+        build_bundle(filename)
+        return Reference(_map_bundle(filename))
+    except (ValueError, struct.error, OSError):
+        # Read-only checkout, or the bundle was replaced by another process mid-read: keep the compiled tables in memory.
+        return Reference(compile_bundle())
+
+REFERENCE = load_reference()
+
+
+if __name__ == "__main__":
+    build_bundle()
+    print(f"Built {BUNDLE_FILE} from {len(source_files())} source files.")
@@ -0,0 +1,231 @@
+#Golden-file regression harness for converted MTN files.
+#Aligns two motions by movement name (through joints.json and conversion.json, not by PRM position)
+#and compares the headers, PRM tables and keyframe matrices in one vectorized pass.
+#Made with <3 by Doggies Galore
+
+import argparse
+import os
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from AIBOMotionBundle import REFERENCE
+from AIBOMotionModel import DEGREES_PER_URAD, JOINTS_MAP, read_motion
+
+BLOCK0_FIELDS = (
+    "Block Number", "Block Size", "Number of Sections", "Major Version",
+    "Minor Version", "Keyframe Count", "Frame Rate", "Options"
+)
+
+# PRM code to movement name per model, taken from conversion.json for codes joints.json doesn't know.
+CONVERSION_PRM_MAP = REFERENCE.conversion_prm_map
+
+def movement_names(motion):
+    joints_map = JOINTS_MAP.get(motion.model, {})
+    conversion_map = CONVERSION_PRM_MAP.get(motion.model, {})
+    return [
+        joints_map.get(prm_code) or conversion_map.get(prm_code) or prm_code
+        for prm_code in motion.joints.prm_codes
+    ]
+
+
+class MotionDiff:
+    __slots__ = (
+        "golden_filename", "candidate_filename", "header_differences", "structural_differences",
+        "prm_differences", "warnings", "joint_names", "max_error_urad", "mean_error_urad", "tolerance_urad"
+    )
+
+    def __init__(self, golden_filename, candidate_filename, tolerance_urad=0):
+        self.golden_filename = golden_filename
+        self.candidate_filename = candidate_filename
+        self.header_differences = []
+        self.structural_differences = []
+        self.prm_differences = []
+        # Header inconsistencies read_motion worked around; reported, but they don't fail the match.
+        self.warnings = []
+        self.joint_names = []
+        self.max_error_urad = np.zeros(0, dtype=np.int64)
+        self.mean_error_urad = np.zeros(0, dtype=np.float64)
+        self.tolerance_urad = tolerance_urad
+
+    @property
+    def failing_joints(self):
+        return [
+            name for name, max_error in zip(self.joint_names, self.max_error_urad.tolist())
+            if max_error > self.tolerance_urad
+        ]
+
+    @property
+    def is_match(self):
+        return not (self.header_differences or self.structural_differences
+                    or self.prm_differences or self.failing_joints)
+
+    def format_report(self):
+        lines = [f"{self.candidate_filename} vs golden {self.golden_filename}: {'OK' if self.is_match else 'DIFFERENT'}"]
+        for title, differences in (("Header", self.header_differences),
+                                   ("Structure", self.structural_differences),
+                                   ("PRM table", self.prm_differences)):
+            for difference in differences:
+                lines.append(f"  {title}: {difference}")
+        for warning in self.warnings:
+            lines.append(f"  Warning: {warning}")
+        if self.joint_names:
+            lines.append("  Per-joint keyframe error (max / mean):")
+            for name, max_error, mean_error in zip(self.joint_names, self.max_error_urad.tolist(),
+                                                   self.mean_error_urad.tolist()):
+                marker = " <--" if max_error > self.tolerance_urad else ""
+                lines.append(
+                    f"    {name}: {max_error} / {mean_error:.1f} urad, "
+                    f"{max_error * DEGREES_PER_URAD:.2f} / {mean_error * DEGREES_PER_URAD:.2f} degrees{marker}"
+                )
+        return "\n".join(lines)
+
+
+def diff_motions(golden, candidate, tolerance_urad=0):
+    diff = MotionDiff(golden.filename, candidate.filename, tolerance_urad)
+    for role, motion in (("golden", golden), ("candidate", candidate)):
+        diff.warnings.extend(f"{role} {warning}" for warning in motion.warnings)
+
+    # Headers
+    if golden.signature != candidate.signature:
+        diff.header_differences.append(f"Signature {golden.signature!r} != {candidate.signature!r}")
+    for field, golden_value, candidate_value in zip(BLOCK0_FIELDS, golden.block0, candidate.block0):
+        if golden_value != candidate_value:
+            target = diff.structural_differences if field in ("Block Size", "Number of Sections") else diff.header_differences
+            target.append(f"Block0 {field} {golden_value} != {candidate_value}")
+    for field in ("chunk_name", "author_name", "format_name"):
+        golden_value = getattr(golden, field)
+        candidate_value = getattr(candidate, field)
+        if golden_value != candidate_value:
+            diff.header_differences.append(f"{field} {golden_value!r} != {candidate_value!r}")
+
+    # Block lengths
+    if len(golden.block_lengths) != len(candidate.block_lengths):
+        diff.structural_differences.append(
+            f"Block count {len(golden.block_lengths) + 1} != {len(candidate.block_lengths) + 1}"
+        )
+    for block_num, (golden_len, candidate_len) in enumerate(zip(golden.block_lengths, candidate.block_lengths), 1):
+        if golden_len != candidate_len:
+            diff.structural_differences.append(f"Block{block_num} length {golden_len} != {candidate_len}")
+    if len(golden) != len(candidate):
+        diff.structural_differences.append(f"Keyframes read {len(golden)} != {len(candidate)}")
+
+    # PRM tables, aligned by movement name
+    golden_names = movement_names(golden)
+    candidate_names = movement_names(candidate)
+    candidate_columns = {name: column for column, name in enumerate(candidate_names)}
+    golden_columns = []
+    matched_columns = []
+    for column, name in enumerate(golden_names):
+        if name not in candidate_columns:
+            diff.prm_differences.append(f"{name} missing from candidate")
+            continue
+        candidate_column = candidate_columns[name]
+        golden_prm = golden.joints.prm_codes[column]
+        candidate_prm = candidate.joints.prm_codes[candidate_column]
+        if golden_prm != candidate_prm:
+            diff.prm_differences.append(f"{name} PRM {golden_prm} != {candidate_prm}")
+        if column != candidate_column:
+            diff.prm_differences.append(f"{name} at position {column} != {candidate_column}")
+        golden_columns.append(column)
+        matched_columns.append(candidate_column)
+    golden_name_set = set(golden_names)
+    for name in candidate_names:
+        if name not in golden_name_set:
+            diff.prm_differences.append(f"{name} not in golden")
+
+    # Keyframe matrices, one subtraction over every shared joint
+    keyframe_count = min(len(golden), len(candidate))
+    if np.any(golden.time_deltas[:keyframe_count] != candidate.time_deltas[:keyframe_count]):
+        mismatched = np.flatnonzero(golden.time_deltas[:keyframe_count] != candidate.time_deltas[:keyframe_count])
+        diff.header_differences.append(f"Time delta differs in keyframes {(mismatched + 1).tolist()}")
+    diff.joint_names = [golden_names[column] for column in golden_columns]
+    if golden_columns and keyframe_count:
+        golden_angles = golden.angles_urad[:keyframe_count, golden_columns].astype(np.int64)
+        candidate_angles = candidate.angles_urad[:keyframe_count, matched_columns].astype(np.int64)
+        error = np.abs(golden_angles - candidate_angles)
+        diff.max_error_urad = error.max(axis=0)
+        diff.mean_error_urad = error.mean(axis=0)
+    else:
+        diff.max_error_urad = np.zeros(len(golden_columns), dtype=np.int64)
+        diff.mean_error_urad = np.zeros(len(golden_columns), dtype=np.float64)
+
+    return diff
+
+def diff_files(golden_filename, candidate_filename, tolerance_urad=0):
+    # Only a file whose keyframes can't be read is refused, as one structural difference instead of
+    # field-by-field noise; header lengths read_motion had to work around come back as warnings.
+    diff = MotionDiff(golden_filename, candidate_filename, tolerance_urad)
+    motions = []
+    for role, filename in (("golden", golden_filename), ("candidate", candidate_filename)):
+        try:
+            motion = read_motion(filename)
+        except (OSError, ValueError, struct.error) as error:
+            diff.structural_differences.append(f"{role} is unreadable ({error})")
+            continue
+        keyframe_count = motion.block0[BLOCK0_FIELDS.index("Keyframe Count")]
+        if not len(motion.joints) or len(motion) != keyframe_count:
+            diff.structural_differences.append(
+                f"{role} keyframes can't be parsed ({len(motion)} of {keyframe_count} keyframes "
+                f"of {len(motion.joints)} joints read)"
+            )
+            continue
+        motions.append(motion)
+    if diff.structural_differences:
+        return diff
+    return diff_motions(*motions, tolerance_urad)
+
+def _diff_pair(args):
+    return diff_files(*args)
+
+def find_golden(golden_dir, candidate_name):
+    # Converter outputs are named <motion>_converted.mtn, goldens may keep either name.
+    golden_filename = os.path.join(golden_dir, candidate_name)
+    if os.path.exists(golden_filename):
+        return golden_filename
+    golden_filename = os.path.join(golden_dir, candidate_name.replace("_converted.mtn", ".mtn"))
+    if os.path.exists(golden_filename):
+        return golden_filename
+    return None
+
+def diff_directory(candidate_dir, golden_dir, tolerance_urad=0, workers=None):
+    pairs = []
+    missing = []
+    for candidate_name in sorted(os.listdir(candidate_dir)):
+        if not candidate_name.lower().endswith(".mtn"):
+            continue
+        golden_filename = find_golden(golden_dir, candidate_name)
+        if golden_filename is None:
+            missing.append(candidate_name)
+            continue
+        pairs.append((golden_filename, os.path.join(candidate_dir, candidate_name), tolerance_urad))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        diffs = list(executor.map(_diff_pair, pairs, chunksize=max(1, len(pairs) // 64)))
+    return diffs, missing
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare converted MTN files against known-good goldens.")
+    parser.add_argument("candidate", nargs="?", default="S2S_converted.mtn", help="converted MTN file or directory")
+    parser.add_argument("golden", nargs="?", default="KnownGoodERS7.mtn", help="golden MTN file or directory")
+    parser.add_argument("--tolerance", type=int, default=0, help="allowed per-joint error in urad")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes for directory mode")
+    args = parser.parse_args()
+
+    if os.path.isdir(args.candidate):
+        diffs, missing = diff_directory(args.candidate, args.golden, args.tolerance, args.workers)
+        for candidate_name in missing:
+            print(f"{candidate_name}: no golden found in {args.golden}")
+        for diff in diffs:
+            if not diff.is_match:
+                print(diff.format_report())
+        failed = sum(not diff.is_match for diff in diffs)
+        print(f"Checked {len(diffs)} files: {len(diffs) - failed} OK, {failed} different, {len(missing)} without golden.")
+        sys.exit(1 if failed or missing else 0)
+    else:
+        diff = diff_files(args.golden, args.candidate, args.tolerance)
+        print(diff.format_report())
+        sys.exit(0 if diff.is_match else 1)
@@ -3,7 +3,10 @@
 #This script only changes the DRX model header so that applications like Skitter will accept it.
 
 import struct
-import json
+
+from AIBOMotionBundle import REFERENCE
+from AIBOMotionModel import pack_block, pack_variable_length_string, write_file_atomically
+from AIBOMotionValidate import validate_mtn_file
 
 # Define constants based on the updated specifications
 SIGNATURE = b"OMTN"
@@ -11,7 +14,7 @@ SIGNATURE = b"OMTN"
 # Format strings for parsing Block0, the header, and keyframes
 BLOCK0_FORMAT = "<IIIHHHHI"
 BLOCK_HEADER_FORMAT = "<II"
-KEYFRAME_HEADER_FORMAT = "<HHII"
+KEYFRAME_HEADER_FORMAT = "<HHIII"
 
 # DRX to ERS model mapping
 PLATFORM_MAP = {
@@ -25,13 +28,11 @@ PLATFORM_MAP = {
 # ERS to DRX model mapping
 DRX_MODEL_MAP = {v: k for k, v in PLATFORM_MAP.items()}
 
-# Load joint PRM to movement names mapping from JSON
-with open('joints.json', 'r') as f:
-    JOINTS_MAP = json.load(f)
+# joint PRM to movement names come from the compiled reference bundle (built from joints.json).
+JOINTS_MAP = REFERENCE.joints_map
 
-# Load conversion of movements from ERS to ERS.
-with open('conversion.json', 'r') as f:
-    CONVERSION_MAP = json.load(f)
+# Conversion of movements from ERS to ERS, from the compiled reference bundle (built from conversion.json).
+CONVERSION_MAP = REFERENCE.conversion_map
 
 def read_variable_length_string(f):
     length_byte = struct.unpack("B", f.read(1))[0]
@@ -43,13 +44,14 @@ def parse_format_platform(format_platform):
 def parse_drx_model(ers_model):
     return DRX_MODEL_MAP.get(ers_model, ers_model)
 
-def pad_to_dword_offset(fw, current_offset):
-    padding_needed = (4 - (current_offset % 4)) % 4
-    if padding_needed > 0:
-        fw.write(b'\x00' * padding_needed)
-    return current_offset + padding_needed
-
 def convert_mtn_file(filename, target_ers_model):
+    # Reject truncated or malformed files before anything is parsed or written
+    validation = validate_mtn_file(filename)
+    if not validation.is_valid:
+        print(validation.format_report())
+        print(f"Skipping {filename}: not a valid MTN file.")
+        return
+
     with open(filename, "rb") as f:
         # Read and verify the signature
         signature = f.read(4)
@@ -69,83 +71,68 @@ def convert_mtn_file(filename, target_ers_model):
         print(f"  Frame Rate (msec/frame): {frame_rate}")
         print(f"  Options: {options}")
 
-        # Prepare to write to a new MTN file
+        # Prepare the new MTN file; every block is rebuilt with its own length, since the new DRX model
+        # name can be longer than the original, and the file is only written once all blocks are done
         new_filename = filename.replace('.mtn', '_converted.mtn')
-        with open(new_filename, "wb") as fw:
-            # Write the original signature and block 0
-            fw.write(signature)
-            fw.write(block0_header)
-
-            # Parse subsequent blocks
-            current_offset = f.tell()
-            for block_index in range(1, num_sections):
-                # Pad to DWORD offset
-                current_offset = pad_to_dword_offset(fw, current_offset)
-                fw.seek(current_offset)
-
-                # Read the block header
-                block_header = f.read(struct.calcsize(BLOCK_HEADER_FORMAT))
-                if not block_header:
-                    break
-                block_num, block_len = struct.unpack(BLOCK_HEADER_FORMAT, block_header)
-
-                # Write the block header to the new file
-                fw.write(block_header)
-
-                if block_index == 1:
-                    # Read and write variable-length strings for file authoring and AIBO model information
-                    action_chunk_name = read_variable_length_string(f)
-                    author_name = read_variable_length_string(f)
-                    format_name_length = struct.unpack("B", f.read(1))[0]
-                    format_name = f.read(format_name_length).decode()
-
-                    # Convert ERS model to DRX model for the header
-                    drx_model = parse_drx_model(target_ers_model)
-
-                    # Write original variable-length strings to the new file
-                    fw.write(len(action_chunk_name).to_bytes(1, 'little'))
-                    fw.write(action_chunk_name.encode())
-                    fw.write(len(author_name).to_bytes(1, 'little'))
-                    fw.write(author_name.encode())
-                    fw.write(len(drx_model).to_bytes(1, 'little'))
-                    fw.write(drx_model.encode())
-
-                elif block_index == 2:
-                    # Read servo count
-                    num_joints = struct.unpack("<H", f.read(2))[0]
-
-                    # Write servo count to the new file
-                    fw.write(struct.pack("<H", num_joints))
-
-                    # Read and replace PRM codes with movement names
-                    for _ in range(num_joints):
-                        prm_code_length = struct.unpack("B", f.read(1))[0]
-                        prm_code = f.read(prm_code_length).decode()
-
-                        # Determine movement name based on current ERS model
-                        if parse_format_platform(format_name) in JOINTS_MAP and prm_code in JOINTS_MAP[parse_format_platform(format_name)]:
-                            movement_name = JOINTS_MAP[parse_format_platform(format_name)][prm_code]
-                        else:
-                            movement_name = prm_code  # fallback to original if not found
-
-                        # Determine PRM code for target ERS model
-                        if movement_name in CONVERSION_MAP and target_ers_model in CONVERSION_MAP[movement_name]:
-                            target_prm_code = CONVERSION_MAP[movement_name][target_ers_model]
-                        else:
-                            target_prm_code = prm_code  # fallback to original if not found
-
-                        # Write modified PRM code to the new file
-                        fw.write(len(target_prm_code).to_bytes(1, 'little'))
-                        fw.write(target_prm_code.encode())
-
-                elif block_index == 3:
-                    # Copy keyframe data as is
-                    keyframe_data = f.read(block_len)
-                    fw.write(keyframe_data)
-
-                # Move file pointer to the start of the next block
-                current_offset += block_len
-                f.seek(current_offset)
+        blocks = []
+
+        # Parse subsequent blocks
+        current_offset = f.tell()
+        for block_index in range(1, num_sections):
+            # Read the block header
+            block_header = f.read(struct.calcsize(BLOCK_HEADER_FORMAT))
+            if not block_header:
+                break
+            block_num, block_len = struct.unpack(BLOCK_HEADER_FORMAT, block_header)
+
+            if block_index == 1:
+                # Read variable-length strings for file authoring and AIBO model information
+                action_chunk_name = read_variable_length_string(f)
+                author_name = read_variable_length_string(f)
+                format_name = read_variable_length_string(f)
+
+                # Convert ERS model to DRX model for the header
+                drx_model = parse_drx_model(target_ers_model)
+
+                # Original chunk and author names, new model name
+                payload = (pack_variable_length_string(action_chunk_name)
+                           + pack_variable_length_string(author_name)
+                           + pack_variable_length_string(drx_model))
+
+            elif block_index == 2:
+                # Read servo count
+                num_joints = struct.unpack("<H", f.read(2))[0]
+                payload = struct.pack("<H", num_joints)
+
+                # Read and replace PRM codes with movement names
+                for _ in range(num_joints):
+                    prm_code = read_variable_length_string(f)
+
+                    # Determine movement name based on current ERS model
+                    if parse_format_platform(format_name) in JOINTS_MAP and prm_code in JOINTS_MAP[parse_format_platform(format_name)]:
+                        movement_name = JOINTS_MAP[parse_format_platform(format_name)][prm_code]
+                    else:
+                        movement_name = prm_code  # fallback to original if not found
+
+                    # Determine PRM code for target ERS model
+                    if movement_name in CONVERSION_MAP and target_ers_model in CONVERSION_MAP[movement_name]:
+                        target_prm_code = CONVERSION_MAP[movement_name][target_ers_model]
+                    else:
+                        target_prm_code = prm_code  # fallback to original if not found
+
+                    payload += pack_variable_length_string(target_prm_code)
+
+            else:
+                # Copy keyframe data (and any further blocks) as is
+                payload = f.read(block_len - struct.calcsize(BLOCK_HEADER_FORMAT))
+
+            blocks.append(pack_block(block_num, payload))
+
+            # Move file pointer to the start of the next block
+            current_offset += block_len
+            f.seek(current_offset)
+
+        write_file_atomically(new_filename, signature + block0_header + b"".join(blocks))
 
         print(f"Conversion completed. Converted file saved as: {new_filename}")
 
@@ -3,7 +3,13 @@
 # Made with <3 by Doggies Galore
 
 import struct
-import json
+
+import numpy as np
+
+from AIBOMotionBundle import REFERENCE
+from AIBOMotionModel import Motion, align_columns, get_joint_table, load_pose_library, match_keyframes_to_poses, read_keyframe_block
+from AIBOMotionSegment import segment_holds
+from AIBOMotionValidate import validate_mtn_file
 
 # Define constants based on the updated specifications
 SIGNATURE = b"OMTN"
@@ -11,7 +17,7 @@ SIGNATURE = b"OMTN"
 # Format strings for parsing Block0, the header, and keyframes
 BLOCK0_FORMAT = "<IIIHHHHI"
 BLOCK_HEADER_FORMAT = "<II"
-KEYFRAME_HEADER_FORMAT = "<HHII"
+KEYFRAME_HEADER_FORMAT = "<HHIII"
 
 # DRX to ERS model mapping
 PLATFORM_MAP = {
@@ -22,15 +28,8 @@ PLATFORM_MAP = {
     "DRX-1000": "ERS-7"
 }
 
-PoseNameLookup = {
-    0: "Sleep",
-    1: "Sit",
-    2: "Stand"
-}
-
-# joint PRM to movement names are stored in a JSON dict.
-with open('joints.json', 'r') as f:
-    JOINTS_MAP = json.load(f)
+# joint PRM to movement names come from the compiled reference bundle (built from joints.json).
+JOINTS_MAP = REFERENCE.joints_map
 
 def read_variable_length_string(f):
     length_byte = struct.unpack("B", f.read(1))[0]
@@ -60,6 +59,13 @@ def parse_format_platform(format_platform):
     return PLATFORM_MAP.get(format_platform, format_platform)
 
 def parse_mtn_file(filename):
+    # Reject truncated or malformed files before anything is parsed or written
+    validation = validate_mtn_file(filename)
+    if not validation.is_valid:
+        print(validation.format_report())
+        print(f"Skipping {filename}: not a valid MTN file.")
+        return
+
     with open(filename, "rb") as f:
         # Read and verify the signature
         signature = f.read(4)
@@ -126,55 +132,38 @@ def parse_mtn_file(filename):
                 print(f"\nMTN Block {block_num}:")
                 print(f"  Block Length: {block_len}")
 
-                # Read keyframes
-                keyframes = []
-                for keyframe_index in range(tile_count):
-                    keyframe_header = f.read(struct.calcsize(KEYFRAME_HEADER_FORMAT))
-                    if not keyframe_header:
-                        break
-                    time_delta, dummy1, dummy2, dummy3 = struct.unpack(KEYFRAME_HEADER_FORMAT, keyframe_header)
-
-                    keyframe_positions = []
-                    for joint_index in range(num_joints):
-                        angle_uradians = struct.unpack("<i", f.read(4))[0]
-                        angle_degrees = angle_uradians * 180.0 / (1000000.0 * 3.141592654)
-                        joint_name = JOINTS_MAP[ers_format_name].get(prm_codes[joint_index], f"Unknown joint {joint_index + 1}")
-                        keyframe_positions.append({
-                            "JointName": joint_name,
-                            "Angle_urad": angle_uradians,
-                            "Angle_degrees": angle_degrees
-                        })
-
-                    keyframes.append(keyframe_positions)
-
-                json_filename = f"./poses/{ers_format_name}.json"
-                with open(json_filename, 'r') as json_file:
-                    json_data = json.load(json_file)
-
-                    # Get all poses from JSON
-                    poses = json_data["Poses"]
-
-                    for pose_idx, pose_data in enumerate(poses):
-                        expected_positions = pose_data["JointPositions"]
-                        matching_keyframes = []
-
-                        for kf_idx, kf_positions in enumerate(keyframes):
-                            keyframe_matching = True
-                            for pos1, pos2 in zip(kf_positions, expected_positions):
-                                if pos1["Angle_degrees"] != pos2["Angle_degrees"]:
-                                    if abs(pos1["Angle_degrees"] - pos2["Angle_degrees"]) > 5:
-                                        keyframe_matching = False
-                                        break
-                            if keyframe_matching:
-                                matching_keyframes.append(kf_idx)
-
-                        if matching_keyframes:
-                            print(f"Pose {PoseNameLookup[pose_idx]} matched in keyframes: {matching_keyframes}")
-
-                        # Print result for this pose
-                        for kf_idx in matching_keyframes:
-                            print(f"Pose {PoseNameLookup[pose_idx]} matched in keyframe {kf_idx}:")
-                            print("The standard " + PoseNameLookup[pose_idx] + " pose for " + ers_format_name + " was found.")
+                # Read keyframes into one contiguous angle matrix
+                headers, angles_urad = read_keyframe_block(f, tile_count, num_joints)
+                keyframes = Motion(get_joint_table(ers_format_name, prm_codes), headers, angles_urad)
+
+                # Get all poses from JSON
+                poses = load_pose_library(ers_format_name)
+
+                # Held postures are matched once per segment and expanded back to keyframes
+                segments = segment_holds(keyframes)
+                segment_matches = match_keyframes_to_poses(segments.representatives(), poses)
+                matches = segments.expand(segment_matches)
+
+                # Partial-servo motions are only compared on the joints they actually drive
+                columns, pose_columns = align_columns(keyframes.joints, poses.joints)
+                if len(columns) < len(poses.joints):
+                    print(f"  Matching on {len(columns)} of {len(poses.joints)} pose joints")
+
+                for pose_idx, pose_name in enumerate(poses.names):
+                    matching_keyframes = np.flatnonzero(matches[:, pose_idx]).tolist()
+
+                    if matching_keyframes:
+                        print(f"Pose {pose_name} matched in keyframes: {matching_keyframes}")
+
+                    # Print result for this pose, once per held segment
+                    for segment_idx in np.flatnonzero(segment_matches[:, pose_idx]).tolist():
+                        start = int(segments.starts[segment_idx])
+                        end = int(segments.ends[segment_idx])
+                        if end - start > 1:
+                            print(f"Pose {pose_name} held in keyframes {start}-{end - 1}:")
+                        else:
+                            print(f"Pose {pose_name} matched in keyframe {start}:")
+                        print("The standard " + pose_name + " pose for " + ers_format_name + " was found.")
 
             # Move file pointer to the start of the next block
             current_offset += block_len
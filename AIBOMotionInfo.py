@@ -3,7 +3,8 @@
 #Made with <3 by Doggies Galore
 
 import struct
-import json
+
+from AIBOMotionBundle import REFERENCE
 
 # The expected Skitter signatrue.
 SIGNATURE = b"OMTN"
@@ -11,7 +12,7 @@ SIGNATURE = b"OMTN"
 # Format strings for parsing Block0, the header, and keyframes
 BLOCK0_FORMAT = "<IIIHHHHI"
 BLOCK_HEADER_FORMAT = "<II"  
-KEYFRAME_HEADER_FORMAT = "<HHII"
+KEYFRAME_HEADER_FORMAT = "<HHIII"
 
 # DRX to ERS model mapping
 PLATFORM_MAP = {
@@ -22,9 +23,8 @@ PLATFORM_MAP = {
     "DRX-1000": "ERS-7"
 }
 
-# joint PRM to movement names are stored in a JSON dict.
-with open('joints.json', 'r') as f:
-    JOINTS_MAP = json.load(f)
+# joint PRM to movement names come from the compiled reference bundle (built from joints.json).
+JOINTS_MAP = REFERENCE.joints_map
 
 def read_variable_length_string(f):
     length_byte = struct.unpack("B", f.read(1))[0]
@@ -129,7 +129,7 @@ def parse_mtn_file(filename):
                     keyframe_header = f.read(struct.calcsize(KEYFRAME_HEADER_FORMAT))
                     if not keyframe_header:
                         break
-                    time_delta, dummy1, dummy2, dummy3 = struct.unpack(KEYFRAME_HEADER_FORMAT, keyframe_header)
+                    time_delta, dummy1, dummy2, dummy3, dummy4 = struct.unpack(KEYFRAME_HEADER_FORMAT, keyframe_header)
                     
                     # Compute elapsed time between keyframes
                     time_msecs = (time_delta + 1) * frame_rate
@@ -0,0 +1,165 @@
+#Batched forward kinematics for AIBO legs and head.
+#Computes knee, foot and head positions for every keyframe of every motion in one vectorized batch,
+#so physical-plausibility checks (feet on the ground, head hitting the legs) can run over a whole archive.
+#Made with <3 by Doggies Galore
+
+import sys
+
+import numpy as np
+
+from AIBOMotionModel import align_columns, get_named_joint_table, read_motion
+
+RADIANS_PER_URAD = 1e-6
+
+# Body frame: x forward, y left, z up, origin at the centre of the body, all lengths in mm.
+# Dimensions are approximate, taken from published ERS model specs; they are good enough for
+# plausibility checks, not for gait planning.
+KINEMATIC_MODELS = {
+    "ERS-110": {"shoulder_x": 59.5, "shoulder_y": 59.2, "upper_leg": 64.0, "front_lower_leg": 67.2, "back_lower_leg": 74.9,
+                "neck": (75.0, 0.0, 15.0), "head_length": 80.0},
+    "ERS-210": {"shoulder_x": 59.5, "shoulder_y": 59.2, "upper_leg": 64.0, "front_lower_leg": 67.2, "back_lower_leg": 74.9,
+                "neck": (75.0, 0.0, 15.0), "head_length": 80.0},
+    "ERS-220": {"shoulder_x": 59.5, "shoulder_y": 59.2, "upper_leg": 64.0, "front_lower_leg": 67.2, "back_lower_leg": 74.9,
+                "neck": (75.0, 0.0, 15.0), "head_length": 80.0},
+    "ERS-310": {"shoulder_x": 45.0, "shoulder_y": 40.0, "upper_leg": 45.0, "front_lower_leg": 50.0, "back_lower_leg": 50.0,
+                "neck": (55.0, 0.0, 20.0), "head_length": 60.0},
+    "ERS-7": {"shoulder_x": 65.0, "shoulder_y": 62.5, "upper_leg": 69.5, "front_lower_leg": 71.5, "back_lower_leg": 76.5,
+              "neck": (67.5, 0.0, 19.5), "head_length": 80.0},
+}
+
+# Legs keyed by the joint name prefix used in joints.json: (x sign, y sign) of the shoulder or hip.
+LEGS = {
+    "FL": (1.0, 1.0),
+    "FR": (1.0, -1.0),
+    "BL": (-1.0, 1.0),
+    "BR": (-1.0, -1.0),
+}
+
+# Every joint the engine reads, in the column order of the angle matrix it works on.
+FK_JOINT_NAMES = tuple(
+    [f"{leg}_LEG_{joint}" for leg in LEGS for joint in ("VERT", "LAT", "KNEE")]
+    + ["HEAD_PITCH", "HEAD_YAW", "HEAD_ROLL", "HEAD_PITCH2"]
+)
+
+END_EFFECTORS = tuple([f"{leg}_KNEE" for leg in LEGS] + [f"{leg}_FOOT" for leg in LEGS] + ["HEAD"])
+
+
+def rotation_x(theta):
+    c, s = np.cos(theta), np.sin(theta)
+    zero, one = np.zeros_like(theta), np.ones_like(theta)
+    return np.stack([one, zero, zero, zero, c, -s, zero, s, c], axis=-1).reshape(theta.shape + (3, 3))
+
+def rotation_y(theta):
+    c, s = np.cos(theta), np.sin(theta)
+    zero, one = np.zeros_like(theta), np.ones_like(theta)
+    return np.stack([c, zero, s, zero, one, zero, -s, zero, c], axis=-1).reshape(theta.shape + (3, 3))
+
+def rotation_z(theta):
+    c, s = np.cos(theta), np.sin(theta)
+    zero, one = np.zeros_like(theta), np.ones_like(theta)
+    return np.stack([c, -s, zero, s, c, zero, zero, zero, one], axis=-1).reshape(theta.shape + (3, 3))
+
+def rotate(rotations, vectors):
+    # Applies a batch of (n x 3 x 3) rotations to one vector or to a matching (n x 3) batch of vectors.
+    return np.einsum("nij,...nj->...ni", rotations, vectors) if np.ndim(vectors) > 1 else rotations @ vectors
+
+def gather_fk_angles(joints, angles_urad):
+    # Reorders a motion's columns into FK_JOINT_NAMES; joints the motion doesn't drive stay at 0.
+    fk_joints = get_named_joint_table(joints.model, FK_JOINT_NAMES)
+    columns, fk_columns = align_columns(joints, fk_joints)
+    radians = np.zeros((angles_urad.shape[0], len(FK_JOINT_NAMES)), dtype=np.float64)
+    radians[:, fk_columns] = angles_urad[:, columns] * RADIANS_PER_URAD
+    return radians
+
+def forward_kinematics(model, radians):
+    # radians: (keyframes x FK_JOINT_NAMES). Returns {end effector: (keyframes x 3) positions in mm}.
+    dimensions = KINEMATIC_MODELS[model]
+    positions = {}
+    column = 0
+    for leg, (x_sign, y_sign) in LEGS.items():
+        vert, lat, knee = radians[:, column], radians[:, column + 1], radians[:, column + 2]
+        column += 3
+
+        shoulder = np.array([x_sign * dimensions["shoulder_x"], y_sign * dimensions["shoulder_y"], 0.0])
+        lower_leg = dimensions["front_lower_leg"] if x_sign > 0 else dimensions["back_lower_leg"]
+
+        # Rotator swings the leg fore/aft, abductor splays it outwards, knee bends the lower leg. Front and
+        # back knees share a sign: S2S.mtn's Sit folds the back paws under the hips with a positive knee.
+        hip = rotation_y(vert) @ rotation_x(y_sign * lat)
+        upper = np.array([0.0, 0.0, -dimensions["upper_leg"]])
+        knee_point = rotate(hip, upper)
+        foot_point = rotate(hip, upper + rotate(rotation_y(knee), np.array([0.0, 0.0, -lower_leg])))
+
+        positions[f"{leg}_KNEE"] = shoulder + knee_point
+        positions[f"{leg}_FOOT"] = shoulder + foot_point
+
+    pitch, yaw, roll, pitch2 = (radians[:, column + offset] for offset in range(4))
+    # Tilt at the neck base, then pan, then the upper tilt/roll at the head itself.
+    head = rotation_y(-pitch) @ rotation_z(yaw) @ rotation_y(-pitch2) @ rotation_x(roll)
+    positions["HEAD"] = np.array(dimensions["neck"]) + rotate(head, np.array([dimensions["head_length"], 0.0, 0.0]))
+    return positions
+
+def batch_forward_kinematics(motions):
+    # Concatenates every keyframe of every motion per model and runs a single FK pass per model.
+    # Returns one {end effector: positions} dict per motion, in the input order.
+    by_model = {}
+    for motion_index, motion in enumerate(motions):
+        by_model.setdefault(motion.model, []).append(motion_index)
+
+    results = [None] * len(motions)
+    for model, motion_indices in by_model.items():
+        if model not in KINEMATIC_MODELS:
+            continue
+        radians = np.concatenate([gather_fk_angles(motions[i].joints, motions[i].angles_urad) for i in motion_indices])
+        positions = forward_kinematics(model, radians)
+        bounds = np.cumsum([0] + [len(motions[i]) for i in motion_indices])
+        for i, start, end in zip(motion_indices, bounds[:-1], bounds[1:]):
+            results[i] = {name: points[start:end] for name, points in positions.items()}
+    return results
+
+
+def feet_on_ground(positions, tolerance_mm=10.0):
+    # Every foot within the tolerance of the plane through the other three, with the body above that floor.
+    # Only the feet's relative layout counts, so a pitched or rolled body (a Sit, a lean) still stands on flat ground.
+    feet = np.stack([positions[f"{leg}_FOOT"] for leg in LEGS], axis=1)
+    if not len(feet):
+        return np.zeros(0, dtype=bool)
+    distances = []
+    for foot in range(len(LEGS)):
+        a, b, c = (feet[:, other] for other in range(len(LEGS)) if other != foot)
+        normal = np.cross(b - a, c - a)
+        area = np.maximum(np.linalg.norm(normal, axis=1), 1e-9)
+        distances.append(np.abs(np.einsum("nj,nj->n", feet[:, foot] - a, normal)) / area)
+    coplanar = np.max(distances, axis=0) <= tolerance_mm
+
+    # Least-squares floor normal (direction of least spread), pointed up along the body's z axis.
+    centroid = feet.mean(axis=1)
+    normal = np.linalg.svd(feet - centroid[:, None, :])[2][:, -1, :]
+    normal *= np.where(normal[:, 2] < 0, -1.0, 1.0)[:, None]
+    body_height = -np.einsum("nj,nj->n", centroid, normal)
+    return coplanar & (body_height > 0)
+
+def head_leg_collisions(positions, clearance_mm=30.0):
+    # Head closer than the clearance to a front knee or foot.
+    head = positions["HEAD"]
+    distances = np.stack([
+        np.linalg.norm(positions[name] - head, axis=1)
+        for name in ("FL_KNEE", "FR_KNEE", "FL_FOOT", "FR_FOOT")
+    ], axis=1)
+    return distances.min(axis=1) < clearance_mm
+
+
+if __name__ == "__main__":
+    filenames = sys.argv[1:] or ["S2S.mtn"]
+    motions = [read_motion(filename) for filename in filenames]
+    for motion, positions in zip(motions, batch_forward_kinematics(motions)):
+        print(f"{motion.filename} ({motion.model}):")
+        if positions is None:
+            print(f"  No kinematic description for {motion.model}")
+            continue
+        grounded = feet_on_ground(positions)
+        collisions = head_leg_collisions(positions)
+        for keyframe_index in range(len(motion)):
+            feet = ", ".join(f"{leg} z={positions[f'{leg}_FOOT'][keyframe_index, 2]:.1f}" for leg in LEGS)
+            print(f"  Keyframe {keyframe_index + 1}: {feet}; "
+                  f"feet on ground: {bool(grounded[keyframe_index])}, head/leg collision: {bool(collisions[keyframe_index])}")
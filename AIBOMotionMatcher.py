@@ -2,7 +2,17 @@
 #Snippets of this applet were developed with an LLM
 
 import struct
-import json
+
+import numpy as np
+
+from AIBOMotionBundle import REFERENCE
+from AIBOMotionModel import (
+    Motion, align_columns, get_joint_table, load_pose_library, match_keyframes_to_poses, pack_block, pack_keyframe_block,
+    pack_variable_length_string, pair_poses, read_keyframe_block, write_file_atomically
+)
+from AIBOMotionRetarget import get_retarget_model
+from AIBOMotionSegment import segment_holds
+from AIBOMotionValidate import validate_mtn_file
 
 # Define constants based on the updated specifications
 SIGNATURE = b"OMTN"
@@ -10,7 +20,7 @@ SIGNATURE = b"OMTN"
 # Format strings for parsing Block0, the header, and keyframes
 BLOCK0_FORMAT = "<IIIHHHHI"
 BLOCK_HEADER_FORMAT = "<II"
-KEYFRAME_HEADER_FORMAT = "<HHII"
+KEYFRAME_HEADER_FORMAT = "<HHIII"
 
 # DRX to ERS model mapping
 PLATFORM_MAP = {
@@ -24,13 +34,11 @@ PLATFORM_MAP = {
 # ERS to DRX model mapping
 DRX_MODEL_MAP = {v: k for k, v in PLATFORM_MAP.items()}
 
-# Load joint PRM to movement names mapping from JSON
-with open('joints.json', 'r') as f:
-    JOINTS_MAP = json.load(f)
+# joint PRM to movement names come from the compiled reference bundle (built from joints.json).
+JOINTS_MAP = REFERENCE.joints_map
 
-# Load conversion of movements from ERS to ERS.
-with open('conversion.json', 'r') as f:
-    CONVERSION_MAP = json.load(f)
+# Conversion of movements from ERS to ERS, from the compiled reference bundle (built from conversion.json).
+CONVERSION_MAP = REFERENCE.conversion_map
 
 def read_variable_length_string(f):
     length_byte = struct.unpack("B", f.read(1))[0]
@@ -42,79 +50,61 @@ def parse_format_platform(format_platform):
 def parse_drx_model(ers_model):
     return DRX_MODEL_MAP.get(ers_model, ers_model)
 
-def pad_to_dword_offset(fw, current_offset):
-    padding_needed = (4 - (current_offset % 4)) % 4
-    if padding_needed > 0:
-        fw.write(b'\x00' * padding_needed)
-    return current_offset + padding_needed
-
-def extract_and_save_joint_positions(f, fw, num_joints, frame_rate, ers_format_name, prm_codes, tile_count, target_ers_model):
+def extract_and_save_joint_positions(f, num_joints, frame_rate, ers_format_name, prm_codes, tile_count, target_ers_model, target_prm_codes):
     # Load poses for the recognized model
-    source_poses_filename = f"./poses/{ers_format_name}.json"
-    target_poses_filename = f"./poses/{target_ers_model}.json"
+    source_poses = load_pose_library(ers_format_name)
+    target_poses = load_pose_library(target_ers_model)
 
-    with open(source_poses_filename, 'r') as source_poses_file:
-        source_poses = json.load(source_poses_file)["Poses"]
+    print("  Keyframes:")
+    headers, angles_urad = read_keyframe_block(f, tile_count, num_joints)
+    keyframes = Motion(get_joint_table(ers_format_name, prm_codes), headers, angles_urad)
 
-    with open(target_poses_filename, 'r') as target_poses_file:
-        target_poses = json.load(target_poses_file)["Poses"]
+    # Columns of the converted file paired with the target poses by the joint names of the written PRM codes
+    target_joints = get_joint_table(target_ers_model, target_prm_codes)
+    columns, pose_columns = align_columns(target_joints, target_poses.joints)
 
-    print("  Keyframes:")
-    keyframes = []
-    for keyframe_index in range(tile_count):
-        keyframe_header = f.read(struct.calcsize(KEYFRAME_HEADER_FORMAT))
-        if not keyframe_header:
-            break
-        time_delta, dummy1, dummy2, dummy3 = struct.unpack(KEYFRAME_HEADER_FORMAT, keyframe_header)
+    # Held postures are matched and retargeted once per segment, then expanded back to keyframes
+    segments = segment_holds(keyframes)
+    representatives = segments.representatives()
+
+    # Source and target poses correspond by name; a keyframe matching a pose the target library lacks is retargeted
+    source_rows, target_rows = pair_poses(source_poses, target_poses)
+
+    # Check every segment against every paired pose at once; the first matching pose wins
+    matches = segments.expand(match_keyframes_to_poses(representatives, source_poses)[:, source_rows])
 
+    # Keyframes that aren't a known pose are retargeted through the fitted per-joint map
+    output_angles = segments.expand(
+        get_retarget_model(ers_format_name, target_ers_model).apply(representatives.angles_urad, representatives.joints)
+    )
+
+    for keyframe in keyframes:
+        time_delta = keyframe.time_delta
         time_msecs = (time_delta + 1) * frame_rate
-        print(f"  Keyframe {keyframe_index + 1}:")
+        print(f"  Keyframe {keyframe.index + 1}:")
         print(f"    Time Delta: {time_delta}, Elapsed Time (msec): {time_msecs}")
 
-        keyframe_positions = []
-        for joint_index in range(num_joints):
-            angle_uradians = struct.unpack("<i", f.read(4))[0]
-            angle_degrees = angle_uradians * 180.0 / (1000000.0 * 3.141592654)
-            joint_name = JOINTS_MAP[ers_format_name].get(prm_codes[joint_index], f"Unknown joint {joint_index + 1}")
-            keyframe_positions.append({
-                "JointName": joint_name,
-                "Angle_urad": angle_uradians,
-                "Angle_degrees": angle_degrees
-            })
-
-        keyframes.append(keyframe_positions)
-        fw.write(keyframe_header)
-
-        # Check for matching pose
-        matching_pose = None
-        for pose in source_poses:
-            match = True
-            for jp, kp in zip(pose["JointPositions"], keyframe_positions):
-                if abs(jp["Angle_degrees"] - kp["Angle_degrees"]) > 5:
-                    match = False
-                    break
-            if match:
-                matching_pose = pose
-                break
-
-        if matching_pose:
+        matched_poses = np.flatnonzero(matches[keyframe.index])
+        if matched_poses.size:
             # Replace with the target model's pose
-            pose_index = source_poses.index(matching_pose)
-            target_pose = target_poses[pose_index]["JointPositions"]
-            print(f"Replacing keyframe {keyframe_index + 1} with pose {pose_index} from {target_ers_model}")
-            for joint_index, target_joint in enumerate(target_pose):
-                if joint_index < num_joints:  # Only replace the existing joints
-                    angle_uradians = int(target_joint["Angle_urad"])
-                    fw.write(struct.pack("<i", angle_uradians))
-                else:
-                    break  # Stop if the target model has more joints than the original model
+            pose_index = int(target_rows[matched_poses[0]])
+            print(f"Replacing keyframe {keyframe.index + 1} with pose {pose_index} from {target_ers_model}")
+            # Only replace the joints present in the file, partial-servo motions keep their own joint list
+            output_angles[keyframe.index, columns] = target_poses.angles_urad[pose_index, pose_columns]
         else:
-            # Write original angles if no matching pose is found
-            for joint_position in keyframe_positions:
-                fw.write(struct.pack("<i", joint_position["Angle_urad"]))
+            print(f"Retargeting keyframe {keyframe.index + 1} from {ers_format_name} to {target_ers_model}")
+
+    return pack_keyframe_block(keyframes.headers, output_angles)
 
 
 def convert_mtn_file(filename, target_ers_model):
+    # Reject truncated or malformed files before anything is parsed or written
+    validation = validate_mtn_file(filename)
+    if not validation.is_valid:
+        print(validation.format_report())
+        print(f"Skipping {filename}: not a valid MTN file.")
+        return
+
     with open(filename, "rb") as f:
         signature = f.read(4)
         if signature != SIGNATURE:
@@ -133,64 +123,62 @@ def convert_mtn_file(filename, target_ers_model):
         print(f"  Options: {options}")
 
         new_filename = filename.replace('.mtn', '_converted.mtn')
-        with open(new_filename, "wb") as fw:
-            fw.write(signature)
-            fw.write(block0_header)
-
-            current_offset = f.tell()
-            for block_index in range(1, num_sections):
-                current_offset = pad_to_dword_offset(fw, current_offset)
-                fw.seek(current_offset)
-
-                block_header = f.read(struct.calcsize(BLOCK_HEADER_FORMAT))
-                if not block_header:
-                    break
-                block_num, block_len = struct.unpack(BLOCK_HEADER_FORMAT, block_header)
-                fw.write(block_header)
-
-                if block_index == 1:
-                    action_chunk_name = read_variable_length_string(f)
-                    author_name = read_variable_length_string(f)
-                    format_name_length = struct.unpack("B", f.read(1))[0]
-                    format_name = f.read(format_name_length).decode()
-
-                    drx_model = parse_drx_model(target_ers_model)
-
-                    fw.write(len(action_chunk_name).to_bytes(1, 'little'))
-                    fw.write(action_chunk_name.encode())
-                    fw.write(len(author_name).to_bytes(1, 'little'))
-                    fw.write(author_name.encode())
-                    fw.write(len(drx_model).to_bytes(1, 'little'))
-                    fw.write(drx_model.encode())
-
-                elif block_index == 2:
-                    num_joints = struct.unpack("<H", f.read(2))[0]
-                    fw.write(struct.pack("<H", num_joints))
-
-                    prm_codes = []
-                    for _ in range(num_joints):
-                        prm_code_length = struct.unpack("B", f.read(1))[0]
-                        prm_code = f.read(prm_code_length).decode()
-                        prm_codes.append(prm_code)
-
-                        if parse_format_platform(format_name) in JOINTS_MAP and prm_code in JOINTS_MAP[parse_format_platform(format_name)]:
-                            movement_name = JOINTS_MAP[parse_format_platform(format_name)][prm_code]
-                        else:
-                            movement_name = prm_code
-
-                        if movement_name in CONVERSION_MAP and target_ers_model in CONVERSION_MAP[movement_name]:
-                            target_prm_code = CONVERSION_MAP[movement_name][target_ers_model]
-                        else:
-                            target_prm_code = prm_code
-
-                        fw.write(len(target_prm_code).to_bytes(1, 'little'))
-                        fw.write(target_prm_code.encode())
-
-                elif block_index == 3:
-                    extract_and_save_joint_positions(f, fw, num_joints, frame_rate, parse_format_platform(format_name), prm_codes, tile_count, target_ers_model)
-
-                current_offset += block_len
-                f.seek(current_offset)
+        # Every block is rebuilt with its own length (the target's DRX model name can be longer than the
+        # source's), and the output is only written once the whole file has converted.
+        blocks = []
+        current_offset = f.tell()
+        for block_index in range(1, num_sections):
+            block_header = f.read(struct.calcsize(BLOCK_HEADER_FORMAT))
+            if not block_header:
+                break
+            block_num, block_len = struct.unpack(BLOCK_HEADER_FORMAT, block_header)
+
+            if block_index == 1:
+                action_chunk_name = read_variable_length_string(f)
+                author_name = read_variable_length_string(f)
+                format_name = read_variable_length_string(f)
+
+                drx_model = parse_drx_model(target_ers_model)
+
+                payload = (pack_variable_length_string(action_chunk_name)
+                           + pack_variable_length_string(author_name)
+                           + pack_variable_length_string(drx_model))
+
+            elif block_index == 2:
+                num_joints = struct.unpack("<H", f.read(2))[0]
+
+                prm_codes = []
+                target_prm_codes = []
+                for _ in range(num_joints):
+                    prm_code = read_variable_length_string(f)
+                    prm_codes.append(prm_code)
+
+                    if parse_format_platform(format_name) in JOINTS_MAP and prm_code in JOINTS_MAP[parse_format_platform(format_name)]:
+                        movement_name = JOINTS_MAP[parse_format_platform(format_name)][prm_code]
+                    else:
+                        movement_name = prm_code
+
+                    if movement_name in CONVERSION_MAP and target_ers_model in CONVERSION_MAP[movement_name]:
+                        target_prm_code = CONVERSION_MAP[movement_name][target_ers_model]
+                    else:
+                        target_prm_code = prm_code
+                    target_prm_codes.append(target_prm_code)
+
+                payload = struct.pack("<H", num_joints) + b"".join(
+                    pack_variable_length_string(target_prm_code) for target_prm_code in target_prm_codes
+                )
+
+            elif block_index == 3:
+                payload = extract_and_save_joint_positions(f, num_joints, frame_rate, parse_format_platform(format_name), prm_codes, tile_count, target_ers_model, target_prm_codes)
+
+            else:
+                payload = f.read(block_len - struct.calcsize(BLOCK_HEADER_FORMAT))
+
+            blocks.append(pack_block(block_num, payload))
+            current_offset += block_len
+            f.seek(current_offset)
+
+        write_file_atomically(new_filename, signature + block0_header + b"".join(blocks))
 
         print(f"Conversion completed. Converted file saved as: {new_filename}")
 
@@ -0,0 +1,473 @@
+#Shared in-memory model for MTN motions and pose libraries.
+#Keyframes are stored as one contiguous int32 matrix (keyframes x joints) per file instead of
+#a dict per joint sample, so a whole archive of motions can be held in RAM for analysis.
+#Made with <3 by Doggies Galore
+
+import io
+import struct
+import json
+
+import numpy as np
+
+from AIBOMotionBundle import REFERENCE, write_file_atomically
+
+# Define constants based on the updated specifications
+SIGNATURE = b"OMTN"
+
+# Format strings for parsing Block0, the header, and keyframes
+BLOCK0_FORMAT = "<IIIHHHHI"
+BLOCK_HEADER_FORMAT = "<II"
+KEYFRAME_HEADER_FORMAT = "<HHIII"
+
+# Keyframe header as a numpy record so a whole keyframe block can be read in one go.
+KEYFRAME_HEADER_DTYPE = np.dtype([
+    ("time_delta", "<u2"),
+    ("dummy1", "<u2"),
+    ("dummy2", "<u4"),
+    ("dummy3", "<u4"),
+    ("dummy4", "<u4")
+])
+
+# Same conversion factor the scripts have always used, so degree values stay identical.
+DEGREES_PER_URAD = 180.0 / (1000000.0 * 3.141592654)
+
+# DRX to ERS model mapping
+PLATFORM_MAP = {
+    "DRX-700": "ERS-110",
+    "DRX-910": "ERS-210",
+    "DRX-900": "ERS-220",
+    "DRX-801": "ERS-310",
+    "DRX-1000": "ERS-7"
+}
+
+# joint PRM to movement names come from the compiled reference bundle (built from joints.json).
+JOINTS_MAP = REFERENCE.joints_map
+
+def parse_format_platform(format_platform):
+    return PLATFORM_MAP.get(format_platform, format_platform)
+
+def urad_to_degrees(angles_urad):
+    return np.asarray(angles_urad, dtype=np.float64) * DEGREES_PER_URAD
+
+
+class JointTable:
+    # One table per (model, PRM list) is shared by every motion that uses it, so the
+    # joint-name strings are stored once instead of once per keyframe sample.
+    __slots__ = ("model", "prm_codes", "joint_names", "index")
+
+    def __init__(self, model, prm_codes, joint_names):
+        self.model = model
+        self.prm_codes = prm_codes
+        self.joint_names = joint_names
+        self.index = {name: i for i, name in enumerate(joint_names)}
+
+    def __len__(self):
+        return len(self.joint_names)
+
+    def __iter__(self):
+        return iter(self.joint_names)
+
+
+_JOINT_TABLES = {}
+
+def get_joint_table(model, prm_codes):
+    key = (model, tuple(prm_codes))
+    table = _JOINT_TABLES.get(key)
+    if table is None:
+        model_joints = JOINTS_MAP.get(model, {})
+        joint_names = tuple(
+            model_joints.get(prm_code, f"Unknown joint {joint_index + 1}")
+            for joint_index, prm_code in enumerate(prm_codes)
+        )
+        table = JointTable(model, key[1], joint_names)
+        _JOINT_TABLES[key] = table
+    return table
+
+def get_named_joint_table(model, joint_names):
+    # Pose libraries are keyed by joint name rather than PRM code.
+    key = (model, None, tuple(joint_names))
+    table = _JOINT_TABLES.get(key)
+    if table is None:
+        prm_lookup = {name: prm_code for prm_code, name in JOINTS_MAP.get(model, {}).items()}
+        prm_codes = tuple(prm_lookup.get(name, "") for name in joint_names)
+        table = JointTable(model, prm_codes, key[2])
+        _JOINT_TABLES[key] = table
+    return table
+
+
+class Keyframe:
+    # Lightweight view onto one row of a Motion; nothing is copied until asked for.
+    __slots__ = ("motion", "index")
+
+    def __init__(self, motion, index):
+        self.motion = motion
+        self.index = index
+
+    @property
+    def time_delta(self):
+        return int(self.motion.headers["time_delta"][self.index])
+
+    @property
+    def header(self):
+        return self.motion.headers[self.index]
+
+    @property
+    def angles_urad(self):
+        return self.motion.angles_urad[self.index]
+
+    @property
+    def angles_degrees(self):
+        return urad_to_degrees(self.angles_urad)
+
+    def to_joint_positions(self):
+        # Serializes to the JointPositions layout used by poses/*.json
+        angles = self.angles_urad.tolist()
+        return [
+            {
+                "JointName": joint_name,
+                "Angle_urad": angle_uradians,
+                "Angle_degrees": angle_uradians * DEGREES_PER_URAD
+            }
+            for joint_name, angle_uradians in zip(self.motion.joints.joint_names, angles)
+        ]
+
+
+class Motion:
+    __slots__ = (
+        "joints", "headers", "angles_urad",
+        "filename", "signature", "block0", "block_lengths",
+        "chunk_name", "author_name", "format_name", "warnings"
+    )
+
+    def __init__(self, joints, headers, angles_urad, filename=None, signature=SIGNATURE, block0=None,
+                 block_lengths=(), chunk_name="", author_name="", format_name="", warnings=()):
+        self.joints = joints
+        self.headers = headers
+        self.angles_urad = np.ascontiguousarray(angles_urad, dtype=np.int32)
+        self.filename = filename
+        self.signature = signature
+        self.block0 = block0
+        self.block_lengths = list(block_lengths)
+        self.chunk_name = chunk_name
+        self.author_name = author_name
+        self.format_name = format_name
+        # Header inconsistencies read_motion worked around, e.g. a block length field that is off.
+        self.warnings = list(warnings)
+
+    @property
+    def model(self):
+        return self.joints.model
+
+    @property
+    def time_deltas(self):
+        return self.headers["time_delta"]
+
+    def __len__(self):
+        return self.angles_urad.shape[0]
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("keyframe index out of range")
+        return Keyframe(self, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield Keyframe(self, index)
+
+    def degrees(self):
+        return urad_to_degrees(self.angles_urad)
+
+    def to_poses(self, pose_names):
+        return [
+            {"Pose": pose_name, "JointPositions": keyframe.to_joint_positions()}
+            for pose_name, keyframe in zip(pose_names, self)
+        ]
+
+
+class PoseLibrary:
+    # poses/<model>.json loaded into a single (poses x joints) int32 matrix.
+    __slots__ = ("names", "joints", "angles_urad")
+
+    def __init__(self, names, joints, angles_urad):
+        self.names = names
+        self.joints = joints
+        self.angles_urad = np.ascontiguousarray(angles_urad, dtype=np.int32)
+
+    @property
+    def model(self):
+        return self.joints.model
+
+    def __len__(self):
+        return len(self.names)
+
+    def degrees(self):
+        return urad_to_degrees(self.angles_urad)
+
+    def to_json(self):
+        return {
+            "Poses": [
+                {
+                    "Pose": pose_name,
+                    "JointPositions": [
+                        {
+                            "JointName": joint_name,
+                            "Angle_urad": angle_uradians,
+                            "Angle_degrees": angle_uradians * DEGREES_PER_URAD
+                        }
+                        for joint_name, angle_uradians in zip(self.joints.joint_names, row)
+                    ]
+                }
+                for pose_name, row in zip(self.names, self.angles_urad.tolist())
+            ]
+        }
+
+
+_POSE_LIBRARIES = {}
+
+def load_pose_library(model, filename=None):
+    # Libraries in ./poses come straight from the mapped reference bundle and are loaded once per model.
+    if filename is None:
+        library = _POSE_LIBRARIES.get(model)
+        if library is not None:
+            return library
+        # A model without a curated library falls back to a discovery run saved as poses/<model>_discovered.json
+        key = model if model in REFERENCE.pose_keys else f"{model}_discovered"
+        if key in REFERENCE.pose_keys:
+            names, joint_names, angles = REFERENCE.pose_arrays(key)
+            library = PoseLibrary(names, get_named_joint_table(model, joint_names), angles)
+            _POSE_LIBRARIES[model] = library
+            return library
+        filename = f"./poses/{model}.json"
+
+    with open(filename, 'r') as json_file:
+        poses = json.load(json_file)["Poses"]
+
+    names = [pose["Pose"] for pose in poses]
+    joint_names = [joint["JointName"] for joint in poses[0]["JointPositions"]] if poses else []
+    angles = np.array(
+        [[int(joint["Angle_urad"]) for joint in pose["JointPositions"]] for pose in poses],
+        dtype=np.int32
+    ).reshape(len(poses), len(joint_names))
+    return PoseLibrary(names, get_named_joint_table(model, joint_names), angles)
+
+
+def read_variable_length_string(f):
+    length_byte = struct.unpack("B", f.read(1))[0]
+    #In mtn files, there is some hex that can be interpreted as broken UTF-8, so we'll ignore it here.
+    return f.read(length_byte).decode("utf-8", errors='ignore')
+
+def read_prm_code(f):
+    prm_string = read_variable_length_string(f)
+    prm_split = prm_string.split("PRM:")
+    if len(prm_split) > 1:
+        return "PRM:" + prm_split[1]
+    return prm_string
+
+def read_keyframe_block(f, tile_count, num_joints):
+    # Reads every keyframe record of Block3 at once and splits it into headers and an angle matrix.
+    record_dtype = np.dtype([("header", KEYFRAME_HEADER_DTYPE), ("angles", "<i4", (num_joints,))])
+    data = f.read(record_dtype.itemsize * tile_count)
+    count = len(data) // record_dtype.itemsize
+    records = np.frombuffer(data, dtype=record_dtype, count=count)
+    headers = records["header"].copy()
+    angles = np.ascontiguousarray(records["angles"], dtype=np.int32).reshape(count, num_joints)
+    return headers, angles
+
+def pack_keyframe_block(headers, angles_urad):
+    num_joints = angles_urad.shape[1]
+    record_dtype = np.dtype([("header", KEYFRAME_HEADER_DTYPE), ("angles", "<i4", (num_joints,))])
+    records = np.empty(len(headers), dtype=record_dtype)
+    records["header"] = headers
+    records["angles"] = angles_urad
+    return records.tobytes()
+
+
+def pad_to_dword(data):
+    return data + b'\x00' * ((4 - (len(data) % 4)) % 4)
+
+def pack_variable_length_string(value):
+    encoded = value.encode()
+    return len(encoded).to_bytes(1, 'little') + encoded
+
+def pack_block(block_num, payload):
+    payload = pad_to_dword(payload)
+    return struct.pack(BLOCK_HEADER_FORMAT, block_num, struct.calcsize(BLOCK_HEADER_FORMAT) + len(payload)) + payload
+
+def write_motion(motion, filename):
+    block0 = motion.block0
+    if block0 is None:
+        block0 = (0, struct.calcsize(BLOCK0_FORMAT), 4, 1, 2, 0, 16, 0)
+    block_num, block_size, num_sections, major_ver, minor_ver, tile_count, frame_rate, options = block0
+
+    blocks = [
+        pack_block(1, pack_variable_length_string(motion.chunk_name)
+                   + pack_variable_length_string(motion.author_name)
+                   + pack_variable_length_string(motion.format_name)),
+        pack_block(2, struct.pack("<H", len(motion.joints))
+                   + b"".join(pack_variable_length_string(prm_code) for prm_code in motion.joints.prm_codes)),
+        pack_block(3, pack_keyframe_block(motion.headers, motion.angles_urad))
+    ]
+
+    block0_header = struct.pack(BLOCK0_FORMAT, block_num, block_size, len(blocks) + 1, major_ver, minor_ver,
+                                len(motion), frame_rate, options)
+    write_file_atomically(filename, motion.signature + block0_header + b"".join(blocks))
+
+
+def locate_blocks(data, num_sections):
+    # (offset, length) of every block after Block0, plus warnings for length fields that are off. Some files
+    # declare a wrong block length (KnownGoodERS7.mtn's Block1 says 44 bytes but holds 52); when the declared
+    # length doesn't land on the next block header, that header is found by scanning forward on dword boundaries.
+    header_size = struct.calcsize(BLOCK_HEADER_FORMAT)
+
+    def is_block_header(offset, block_index):
+        if offset + header_size > len(data):
+            return False
+        block_num, block_len = struct.unpack_from(BLOCK_HEADER_FORMAT, data, offset)
+        return block_num == block_index and header_size <= block_len <= len(data) - offset
+
+    offsets = []
+    declared = []
+    offset = len(SIGNATURE) + struct.calcsize(BLOCK0_FORMAT)
+    for block_index in range(1, num_sections):
+        if not is_block_header(offset, block_index):
+            start = offsets[-1] + header_size if offsets else offset
+            offset = next((candidate for candidate in range(start, len(data) - header_size + 1, 4)
+                           if is_block_header(candidate, block_index)), None)
+            if offset is None:
+                break
+        offsets.append(offset)
+        declared.append(struct.unpack_from(BLOCK_HEADER_FORMAT, data, offset)[1])
+        offset += declared[-1]
+
+    lengths = [next_offset - offset for offset, next_offset in zip(offsets, offsets[1:])] + declared[len(offsets) - 1:]
+    warnings = [
+        f"Block{block_index} length field says {declared_len} bytes, the block holds {block_len}"
+        for block_index, (declared_len, block_len) in enumerate(zip(declared, lengths), 1)
+        if declared_len != block_len
+    ]
+    return list(zip(offsets, lengths)), warnings
+
+def _unpack_strings(payload, count, first_length=None):
+    # Length-prefixed strings filling the payload up to its dword padding, or None if they don't.
+    strings = []
+    position = 0
+    for string_index in range(count):
+        if position >= len(payload):
+            return None
+        length = payload[position] if first_length is None or string_index else first_length
+        end = position + 1 + length
+        if end > len(payload):
+            return None
+        strings.append(payload[position + 1:end].decode("utf-8", errors='ignore'))
+        position = end
+    if len(payload) - position > 3 or payload[position:].strip(b'\x00'):
+        return None
+    return strings
+
+def read_block1_strings(payload):
+    # Chunk, author and format names. When they don't fill the block, the chunk name's length byte is off
+    # (16 for KnownGoodERS7.mtn's 24-character name) and its real length is the one that makes the rest fit.
+    strings = _unpack_strings(payload, 3)
+    if strings is not None:
+        return strings, []
+    for chunk_length in range(256):
+        strings = _unpack_strings(payload, 3, chunk_length)
+        if strings is not None:
+            return strings, [f"chunk name length byte says {payload[0]} bytes, the name is {chunk_length}"]
+    # Neither reading fits; read the strings as the length bytes say, like before.
+    f = io.BytesIO(payload)
+    return [read_variable_length_string(f) for _ in range(3)], []
+
+def read_motion_model(filename):
+    # The ERS model of a file from its Block1 format name alone, without reading the PRM table or keyframes.
+    with open(filename, "rb") as f:
+        data = f.read()
+    num_sections = struct.unpack_from(BLOCK0_FORMAT, data, 4)[2]
+    blocks, _ = locate_blocks(data, min(num_sections, 3))
+    if not blocks:
+        return None
+    offset, block_len = blocks[0]
+    (_, _, format_name), _ = read_block1_strings(data[offset + struct.calcsize(BLOCK_HEADER_FORMAT):offset + block_len])
+    return parse_format_platform(format_name)
+
+def read_motion(filename):
+    with open(filename, "rb") as f:
+        data = f.read()
+
+    signature = data[:4]
+    block0 = struct.unpack_from(BLOCK0_FORMAT, data, 4)
+    block_num, block_size, num_sections, major_ver, minor_ver, tile_count, frame_rate, options = block0
+
+    chunk_name = author_name = format_name = ""
+    prm_codes = []
+    num_joints = 0
+    headers = np.zeros(0, dtype=KEYFRAME_HEADER_DTYPE)
+    angles = np.zeros((0, 0), dtype=np.int32)
+
+    blocks, warnings = locate_blocks(data, num_sections)
+    header_size = struct.calcsize(BLOCK_HEADER_FORMAT)
+    f = io.BytesIO(data)
+    for block_index, (offset, block_len) in enumerate(blocks, 1):
+        f.seek(offset + header_size)
+
+        if block_index == 1:
+            (chunk_name, author_name, format_name), string_warnings = read_block1_strings(
+                data[offset + header_size:offset + block_len])
+            warnings.extend(string_warnings)
+
+        elif block_index == 2:
+            num_joints = struct.unpack("<H", f.read(2))[0]
+            prm_codes = [read_prm_code(f) for _ in range(num_joints)]
+
+        elif block_index == 3:
+            # Only the records inside the block count, so a short Block3 reads fewer than tile_count keyframes.
+            headers, angles = read_keyframe_block(
+                io.BytesIO(data[offset + header_size:offset + block_len]), tile_count, num_joints)
+
+    joints = get_joint_table(parse_format_platform(format_name), prm_codes)
+    return Motion(
+        joints, headers, angles,
+        filename=filename, signature=signature, block0=block0, block_lengths=[block_len for _, block_len in blocks],
+        chunk_name=chunk_name, author_name=author_name, format_name=format_name, warnings=warnings
+    )
+
+
+_ALIGNMENTS = {}
+
+def align_columns(joints, other_joints):
+    # Index arrays pairing the columns of two joint tables by joint name, computed once per pair of
+    # tables. Partial-servo motions and reordered PRM lists only compare the joints both sides have.
+    key = (joints, other_joints)
+    alignment = _ALIGNMENTS.get(key)
+    if alignment is None:
+        pairs = [
+            (column, other_joints.index[name])
+            for column, name in enumerate(joints.joint_names)
+            if name in other_joints.index
+        ]
+        columns = np.array([column for column, _ in pairs], dtype=np.intp)
+        other_columns = np.array([other_column for _, other_column in pairs], dtype=np.intp)
+        alignment = (columns, other_columns)
+        _ALIGNMENTS[key] = alignment
+    return alignment
+
+def pair_poses(pose_library, other_library):
+    # Row index arrays pairing the poses of two libraries by pose name; poses only one side has are left out.
+    other_index = {name: row for row, name in enumerate(other_library.names)}
+    pairs = [(row, other_index[name]) for row, name in enumerate(pose_library.names) if name in other_index]
+    rows = np.array([row for row, _ in pairs], dtype=np.intp)
+    other_rows = np.array([other_row for _, other_row in pairs], dtype=np.intp)
+    return rows, other_rows
+
+def match_keyframes_to_poses(motion, pose_library, tolerance_degrees=5):
+    # Returns a (keyframes x poses) boolean matrix; a keyframe matches a pose when every
+    # joint both sides share is within the tolerance.
+    columns, pose_columns = align_columns(motion.joints, pose_library.joints)
+    if not columns.size:
+        return np.zeros((len(motion), len(pose_library)), dtype=bool)
+    keyframe_degrees = urad_to_degrees(motion.angles_urad[:, columns])
+    pose_degrees = urad_to_degrees(pose_library.angles_urad[:, pose_columns])
+    difference = np.abs(keyframe_degrees[:, None, :] - pose_degrees[None, :, :])
+    return (difference <= tolerance_degrees).all(axis=2)
@@ -0,0 +1,211 @@
+#Unsupervised pose discovery across a corpus of MTN files.
+#Keyframes of one model are streamed in fixed-size batches through mini-batch k-means, and the cluster
+#centres are saved as candidate poses (with per-joint spread) in the same {"Poses": [...]} layout as ./poses.
+#Made with <3 by Doggies Galore
+
+import argparse
+import json
+import os
+import struct
+
+import numpy as np
+
+from AIBOMotionModel import (
+    DEGREES_PER_URAD, JOINTS_MAP, align_columns, get_named_joint_table, read_motion, read_motion_model,
+    write_file_atomically
+)
+from AIBOMotionValidate import validate_mtn_file
+
+
+def find_mtn_files(directory):
+    for root, _, names in os.walk(directory):
+        for name in sorted(names):
+            if name.lower().endswith(".mtn"):
+                yield os.path.join(root, name)
+
+def load_model_keyframes(filenames, model):
+    # Every usable motion of the model parsed once, as int32 (keyframes x joints) matrices in the model's
+    # joints.json order. Only motions that drive every joint of the model are used; partial-servo keyframes
+    # would pull centres towards 0 on missing joints. Other models' files are skipped from their Block1
+    # format name before they are validated or their keyframes read.
+    model_joints = get_named_joint_table(model, tuple(JOINTS_MAP[model].values()))
+    keyframes = []
+    for filename in filenames:
+        try:
+            if read_motion_model(filename) != model:
+                continue
+        except (OSError, ValueError, struct.error):
+            continue
+        if not validate_mtn_file(filename).is_valid:
+            continue
+        motion = read_motion(filename)
+        columns, model_columns = align_columns(motion.joints, model_joints)
+        if len(model_columns) != len(model_joints):
+            continue
+        angles = np.empty((len(motion), len(model_joints)), dtype=np.int32)
+        angles[:, model_columns] = motion.angles_urad[:, columns]
+        keyframes.append(angles)
+    return keyframes
+
+def iter_keyframe_batches(keyframes, batch_size=65536):
+    # Yields (batch x joints) float arrays from the matrices load_model_keyframes returned.
+    if not keyframes:
+        return
+    buffer = np.empty((batch_size, keyframes[0].shape[1]), dtype=np.float64)
+    filled = 0
+    for angles in keyframes:
+        start = 0
+        while start < len(angles):
+            take = min(batch_size - filled, len(angles) - start)
+            buffer[filled:filled + take] = angles[start:start + take]
+            filled += take
+            start += take
+            if filled == batch_size:
+                yield buffer.copy()
+                filled = 0
+    if filled:
+        yield buffer[:filled].copy()
+
+def squared_distances(points, centres):
+    # (points x centres) squared Euclidean distances without materialising the difference tensor.
+    return (
+        (points ** 2).sum(axis=1)[:, None]
+        - 2.0 * points @ centres.T
+        + (centres ** 2).sum(axis=1)[None, :]
+    )
+
+
+class MiniBatchKMeans:
+    __slots__ = ("num_clusters", "centres", "counts", "rng")
+
+    def __init__(self, num_clusters, seed=0):
+        self.num_clusters = num_clusters
+        self.centres = None
+        self.counts = None
+        self.rng = np.random.default_rng(seed)
+
+    def _initialise(self, batch):
+        # k-means++ seeding on the first batch.
+        num_clusters = min(self.num_clusters, len(batch))
+        centres = [batch[self.rng.integers(len(batch))]]
+        closest = squared_distances(batch, np.array(centres))[:, 0]
+        for _ in range(1, num_clusters):
+            total = closest.sum()
+            if total <= 0:
+                break
+            chosen = self.rng.choice(len(batch), p=np.clip(closest, 0, None) / total)
+            centres.append(batch[chosen])
+            closest = np.minimum(closest, squared_distances(batch, batch[chosen][None, :])[:, 0])
+        self.centres = np.array(centres)
+        self.counts = np.zeros(len(self.centres), dtype=np.int64)
+
+    def partial_fit(self, batch):
+        if self.centres is None:
+            self._initialise(batch)
+        labels = squared_distances(batch, self.centres).argmin(axis=1)
+        # Per-centre learning rate 1 / count, applied to the whole batch at once.
+        batch_counts = np.bincount(labels, minlength=len(self.centres))
+        batch_sums = np.zeros_like(self.centres)
+        np.add.at(batch_sums, labels, batch)
+        updated = batch_counts > 0
+        self.counts += batch_counts
+        self.centres[updated] += (
+            batch_sums[updated] - batch_counts[updated, None] * self.centres[updated]
+        ) / self.counts[updated, None]
+        return labels
+
+    def predict(self, batch):
+        return squared_distances(batch, self.centres).argmin(axis=1)
+
+
+class ClusterStatistics:
+    # Streaming per-cluster count, mean and spread (batched Chan/Welford merge).
+    __slots__ = ("counts", "means", "sum_squares")
+
+    def __init__(self, num_clusters, num_joints):
+        self.counts = np.zeros(num_clusters, dtype=np.int64)
+        self.means = np.zeros((num_clusters, num_joints))
+        self.sum_squares = np.zeros((num_clusters, num_joints))
+
+    def update(self, batch, labels):
+        batch_counts = np.bincount(labels, minlength=len(self.counts))
+        batch_sums = np.zeros_like(self.means)
+        np.add.at(batch_sums, labels, batch)
+        present = batch_counts > 0
+        batch_means = np.zeros_like(self.means)
+        batch_means[present] = batch_sums[present] / batch_counts[present, None]
+        batch_sum_squares = np.zeros_like(self.sum_squares)
+        np.add.at(batch_sum_squares, labels, (batch - batch_means[labels]) ** 2)
+
+        total = self.counts + batch_counts
+        delta = batch_means - self.means
+        weight = np.zeros(len(self.counts))
+        weight[present] = batch_counts[present] / total[present]
+        self.sum_squares += batch_sum_squares + delta ** 2 * (self.counts * weight)[:, None]
+        self.means += delta * weight[:, None]
+        self.counts = total
+
+    @property
+    def spread(self):
+        spread = np.zeros_like(self.sum_squares)
+        populated = self.counts > 0
+        spread[populated] = np.sqrt(self.sum_squares[populated] / self.counts[populated, None])
+        return spread
+
+
+def discover_poses(filenames, model, num_clusters=8, epochs=3, batch_size=65536, seed=0):
+    # Files are parsed once; every epoch and the statistics pass stream the same matrices.
+    keyframes = load_model_keyframes(filenames, model)
+    kmeans = MiniBatchKMeans(num_clusters, seed)
+    for _ in range(epochs):
+        for batch in iter_keyframe_batches(keyframes, batch_size):
+            kmeans.partial_fit(batch)
+    if kmeans.centres is None:
+        return {"Poses": []}
+
+    # Final pass with frozen centres for the pose angles, member counts and per-joint spread.
+    joint_names = tuple(JOINTS_MAP[model].values())
+    statistics = ClusterStatistics(len(kmeans.centres), len(joint_names))
+    for batch in iter_keyframe_batches(keyframes, batch_size):
+        statistics.update(batch, kmeans.predict(batch))
+
+    poses = []
+    spread = statistics.spread
+    for cluster in np.argsort(-statistics.counts):
+        if statistics.counts[cluster] == 0:
+            continue
+        angles = np.rint(statistics.means[cluster]).astype(np.int64).tolist()
+        poses.append({
+            "Pose": f"Discovered {len(poses) + 1}",
+            "KeyframeCount": int(statistics.counts[cluster]),
+            "JointPositions": [
+                {
+                    "JointName": joint_name,
+                    "Angle_urad": angle_uradians,
+                    "Angle_degrees": angle_uradians * DEGREES_PER_URAD,
+                    "Spread_degrees": float(joint_spread * DEGREES_PER_URAD)
+                }
+                for joint_name, angle_uradians, joint_spread in zip(joint_names, angles, spread[cluster].tolist())
+            ]
+        })
+    return {"Poses": poses}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cluster keyframes across MTN files into candidate poses.")
+    parser.add_argument("model", help="ERS model to discover poses for, e.g. ERS-7")
+    parser.add_argument("directory", nargs="?", default=".", help="directory searched recursively for MTN files")
+    parser.add_argument("--clusters", type=int, default=8)
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=65536)
+    parser.add_argument("--output", default=None, help="defaults to ./poses/<model>_discovered.json")
+    args = parser.parse_args()
+
+    if args.model not in JOINTS_MAP:
+        print(f"Unsupported ERS model: {args.model}. Supported models: {list(JOINTS_MAP)}")
+    else:
+        output = args.output or f"./poses/{args.model}_discovered.json"
+        poses_data = discover_poses(find_mtn_files(args.directory), args.model, args.clusters, args.epochs, args.batch_size)
+        # Ident and Matcher load this file at import, so it is replaced in one step rather than rewritten in place.
+        write_file_atomically(output, json.dumps(poses_data, indent=4).encode("utf-8"))
+        print(f"Saved {len(poses_data['Poses'])} discovered poses to {output}")
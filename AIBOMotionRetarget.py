@@ -0,0 +1,95 @@
+#Cross-model retargeting fitted from the captured pose libraries in ./poses.
+#Each movement gets an affine map (target = scale * source + offset) fitted by least squares over the
+#poses both models have in common, so keyframes that aren't a known pose can still be converted. Results are
+#clamped to the range each joint covers in the target model's pose library, so extrapolation can't leave it.
+#Made with <3 by Doggies Galore
+
+from functools import lru_cache
+
+import numpy as np
+
+from AIBOMotionModel import DEGREES_PER_URAD, align_columns, get_named_joint_table, load_pose_library, pair_poses
+from AIBOMotionTransform import Clamp, FusedTransform
+
+# Ridge weight (urad^2) pulling each joint's scale towards 1. The pose libraries only hold a handful of
+# poses, so without it a joint that barely moves between them would get a wild scale.
+RIDGE_URAD2 = 100000.0 ** 2
+
+
+class RetargetModel:
+    __slots__ = ("source_model", "target_model", "joints", "scale", "offset", "clamp", "_column_cache")
+
+    def __init__(self, source_model, target_model, joint_names, scale, offset, limits_degrees=None):
+        self.source_model = source_model
+        self.target_model = target_model
+        self.joints = get_named_joint_table(source_model, joint_names)
+        self.scale = scale
+        self.offset = offset
+        # limits_degrees maps joint name to the (min, max) the target allows; other joints are only kept in int32.
+        self.clamp = Clamp(limits_degrees)
+        self._column_cache = {}
+
+    def column_transform(self, joints):
+        # The affine map and clamp fused in the column order of a motion's joint table; joints without a fit
+        # pass through unchanged.
+        fused = self._column_cache.get(joints)
+        if fused is None:
+            columns, fitted_columns = align_columns(joints, self.joints)
+            scale = np.ones(len(joints), dtype=np.float64)
+            offset = np.zeros(len(joints), dtype=np.float64)
+            scale[columns] = self.scale[fitted_columns]
+            offset[columns] = self.offset[fitted_columns]
+            fused = FusedTransform(len(joints))
+            fused.then_affine(np.arange(len(joints)), scale, offset)
+            self.clamp.fuse_into(fused, joints.joint_names)
+            self._column_cache[joints] = fused
+        return fused
+
+    def apply(self, angles_urad, joints):
+        # One broadcasted multiply-add and clip over the whole (keyframes x joints) matrix.
+        return self.column_transform(joints).apply_angles(angles_urad)
+
+
+def fit_affine(source_urad, target_urad, ridge=RIDGE_URAD2):
+    # Per-column least squares for target = scale * source + offset, solved in closed form for every joint at once.
+    source = np.asarray(source_urad, dtype=np.float64)
+    target = np.asarray(target_urad, dtype=np.float64)
+    source_mean = source.mean(axis=0)
+    target_mean = target.mean(axis=0)
+    source_centered = source - source_mean
+    target_centered = target - target_mean
+    covariance = (source_centered * target_centered).sum(axis=0)
+    variance = (source_centered ** 2).sum(axis=0)
+    scale = (covariance + ridge) / (variance + ridge)
+    offset = target_mean - scale * source_mean
+    return scale, offset
+
+@lru_cache(maxsize=None)
+def get_retarget_model(source_model, target_model):
+    source_poses = load_pose_library(source_model)
+    target_poses = load_pose_library(target_model)
+
+    # Poses correspond by name, joints by movement name.
+    source_rows, target_rows = pair_poses(source_poses, target_poses)
+    joint_names = [name for name in source_poses.joints.joint_names if name in target_poses.joints.index]
+
+    if not source_rows.size or not joint_names:
+        return RetargetModel(source_model, target_model, [], np.ones(0), np.zeros(0))
+
+    source_columns = [source_poses.joints.index[name] for name in joint_names]
+    target_columns = [target_poses.joints.index[name] for name in joint_names]
+    source = source_poses.angles_urad[np.ix_(source_rows, source_columns)]
+    target = target_poses.angles_urad[np.ix_(target_rows, target_columns)]
+
+    scale, offset = fit_affine(source, target)
+
+    # Every target pose counts towards the observed range, not only the ones paired with the source.
+    target_angles = target_poses.angles_urad[:, target_columns]
+    limits_degrees = {
+        name: (lower * DEGREES_PER_URAD, upper * DEGREES_PER_URAD)
+        for name, lower, upper in zip(joint_names, target_angles.min(axis=0).tolist(), target_angles.max(axis=0).tolist())
+    }
+    return RetargetModel(source_model, target_model, joint_names, scale, offset, limits_degrees)
+
+def retarget_motion(motion, target_model):
+    return get_retarget_model(motion.model, target_model).apply(motion.angles_urad, motion.joints)
@@ -0,0 +1,97 @@
+#Static-hold segmentation and run-length encoding of motions.
+#Consecutive keyframes that hold the same posture (within a tolerance) are collapsed into one segment,
+#so matching, retargeting and reporting run once per segment and expand back with np.repeat.
+#Made with <3 by Doggies Galore
+
+import sys
+
+import numpy as np
+
+from AIBOMotionModel import DEGREES_PER_URAD, Motion, read_motion
+
+
+class Segments:
+    __slots__ = ("motion", "starts", "lengths")
+
+    def __init__(self, motion, starts, lengths):
+        self.motion = motion
+        self.starts = starts
+        self.lengths = lengths
+
+    def __len__(self):
+        return len(self.starts)
+
+    @property
+    def ends(self):
+        # Exclusive end keyframe of every segment.
+        return self.starts + self.lengths
+
+    @property
+    def is_hold(self):
+        return self.lengths > 1
+
+    def representatives(self):
+        # One keyframe per segment (its first), as a Motion sharing the original joint table.
+        motion = self.motion
+        return Motion(
+            motion.joints, motion.headers[self.starts], motion.angles_urad[self.starts],
+            filename=motion.filename, signature=motion.signature, block0=motion.block0,
+            chunk_name=motion.chunk_name, author_name=motion.author_name, format_name=motion.format_name
+        )
+
+    def expand(self, per_segment):
+        # Per-segment results back to one row per keyframe.
+        return np.repeat(per_segment, self.lengths, axis=0)
+
+    def durations_msec(self):
+        # Elapsed time per keyframe is (time_delta + 1) * frame_rate, summed over each segment.
+        frame_rate = self.motion.block0[6] if self.motion.block0 else 0
+        elapsed = (self.motion.time_deltas.astype(np.int64) + 1) * frame_rate
+        if not len(self):
+            return elapsed
+        return np.add.reduceat(elapsed, self.starts)
+
+
+def segment_holds(motion, tolerance_degrees=0.0, window=16):
+    # A segment lasts while every joint stays within the tolerance of the segment's first keyframe, so slow
+    # drifts can't build up inside one hold.
+    angles = motion.angles_urad.astype(np.int64)
+    if not len(angles):
+        return Segments(motion, np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp))
+    if tolerance_degrees <= 0:
+        # Exact holds: staying equal to the first keyframe is staying equal to the previous one, so a
+        # single diff over the whole matrix finds every segment start.
+        moved = (np.diff(angles, axis=0) != 0).any(axis=1)
+        starts = np.concatenate(([0], np.flatnonzero(moved) + 1)).astype(np.intp)
+    else:
+        starts = _anchored_starts(angles, tolerance_degrees / DEGREES_PER_URAD, window)
+    lengths = np.diff(np.append(starts, len(angles)))
+    return Segments(motion, starts, lengths)
+
+def _anchored_starts(angles, tolerance_urad, window):
+    # Each segment scans ahead in doubling windows, keeping the whole pass linear in the number of keyframes.
+    starts = []
+    start = 0
+    while start < len(angles):
+        starts.append(start)
+        end = start + 1
+        size = window
+        while end < len(angles):
+            moved = (np.abs(angles[end:end + size] - angles[start]) > tolerance_urad).any(axis=1)
+            if moved.any():
+                end += int(moved.argmax())
+                break
+            end += len(moved)
+            size *= 2
+        start = end
+    return np.array(starts, dtype=np.intp)
+
+if __name__ == "__main__":
+    filename = sys.argv[1] if len(sys.argv) > 1 else "S2S.mtn"
+    tolerance = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    motion = read_motion(filename)
+    segments = segment_holds(motion, tolerance)
+    print(f"{filename}: {len(motion)} keyframes in {len(segments)} segments (tolerance {tolerance} degrees)")
+    for start, end, duration in zip(segments.starts.tolist(), segments.ends.tolist(), segments.durations_msec().tolist()):
+        kind = "hold" if end - start > 1 else "move"
+        print(f"  Keyframes {start + 1}-{end}: {kind}, {duration} msec")
@@ -0,0 +1,180 @@
+#Composable motion transformations (mirror, time-scale, offset, clamp).
+#Stages are declared once and fused into a single permutation + multiply-add + clip over the keyframe
+#matrix, so a catalog of variants costs one parse plus one cheap array pass per variant.
+#Made with <3 by Doggies Galore
+
+import os
+
+import numpy as np
+
+from AIBOMotionModel import DEGREES_PER_URAD, Motion, read_motion, write_motion
+
+INT32_MIN = np.iinfo(np.int32).min
+INT32_MAX = np.iinfo(np.int32).max
+TIME_DELTA_MAX = np.iinfo(np.uint16).max
+
+# Left/right joint name prefixes swapped by Mirror, taken from the names in joints.json.
+MIRROR_PREFIXES = (("FL_", "FR_"), ("BL_", "BR_"), ("LEFT_", "RIGHT_"))
+
+# Joints that turn sideways around the body's centre line; mirroring flips their sign.
+MIRROR_NEGATED_JOINTS = ("HEAD_YAW", "HEAD_ROLL", "TAIL_HORZ")
+
+def degrees_to_urad(angle_degrees):
+    return angle_degrees / DEGREES_PER_URAD
+
+def mirrored_joint_name(joint_name):
+    for left, right in MIRROR_PREFIXES:
+        if joint_name.startswith(left):
+            return right + joint_name[len(left):]
+        if joint_name.startswith(right):
+            return left + joint_name[len(right):]
+    return joint_name
+
+
+class FusedTransform:
+    # y = clip(scale * x[:, permutation] + offset, lower, upper), time deltas scaled by time_scale.
+    __slots__ = ("permutation", "scale", "offset", "lower", "upper", "time_scale")
+
+    def __init__(self, num_joints):
+        self.permutation = np.arange(num_joints)
+        self.scale = np.ones(num_joints, dtype=np.float64)
+        self.offset = np.zeros(num_joints, dtype=np.float64)
+        self.lower = np.full(num_joints, float(INT32_MIN))
+        self.upper = np.full(num_joints, float(INT32_MAX))
+        self.time_scale = 1.0
+
+    def then_affine(self, permutation, scale, offset):
+        # Composes another per-column affine stage after this one. Clip bounds are pushed through
+        # the affine map so that every clamp still happens in the single final clip.
+        self.permutation = self.permutation[permutation]
+        self.offset = scale * self.offset[permutation] + offset
+        lower = scale * self.lower[permutation] + offset
+        upper = scale * self.upper[permutation] + offset
+        self.lower = np.minimum(lower, upper)
+        self.upper = np.maximum(lower, upper)
+        self.scale = scale * self.scale[permutation]
+
+    def then_clip(self, lower, upper):
+        # clip(clip(x, a, b), c, d) == clip(x, min(max(a, c), d), max(min(b, d), c))
+        self.lower, self.upper = (
+            np.minimum(np.maximum(self.lower, lower), upper),
+            np.maximum(np.minimum(self.upper, upper), lower)
+        )
+
+    def apply_angles(self, angles_urad):
+        transformed = np.asarray(angles_urad, dtype=np.float64)[:, self.permutation]
+        transformed *= self.scale
+        transformed += self.offset
+        np.clip(transformed, self.lower, self.upper, out=transformed)
+        return np.rint(transformed).astype(np.int32)
+
+    def apply_headers(self, headers):
+        headers = headers.copy()
+        if self.time_scale != 1.0:
+            # Elapsed time per keyframe is (time_delta + 1) * frame_rate, so scale the whole span.
+            frames = np.rint((headers["time_delta"].astype(np.float64) + 1) * self.time_scale) - 1
+            headers["time_delta"] = np.clip(frames, 0, TIME_DELTA_MAX).astype(np.uint16)
+        return headers
+
+    def apply(self, motion):
+        return Motion(
+            motion.joints, self.apply_headers(motion.headers), self.apply_angles(motion.angles_urad),
+            filename=motion.filename, signature=motion.signature, block0=motion.block0,
+            chunk_name=motion.chunk_name, author_name=motion.author_name, format_name=motion.format_name
+        )
+
+
+class Mirror:
+    def fuse_into(self, fused, joint_names):
+        index = {name: column for column, name in enumerate(joint_names)}
+        permutation = np.array([index.get(mirrored_joint_name(name), column) for column, name in enumerate(joint_names)])
+        scale = np.array([-1.0 if name in MIRROR_NEGATED_JOINTS else 1.0 for name in joint_names])
+        fused.then_affine(permutation, scale, np.zeros(len(joint_names)))
+
+
+class TimeScale:
+    # factor > 1 slows the motion down, factor < 1 speeds it up.
+    def __init__(self, factor):
+        self.factor = factor
+
+    def fuse_into(self, fused, joint_names):
+        fused.time_scale *= self.factor
+
+
+class Offset:
+    def __init__(self, offsets_degrees):
+        self.offsets_degrees = dict(offsets_degrees)
+
+    def fuse_into(self, fused, joint_names):
+        offset = np.array([degrees_to_urad(self.offsets_degrees.get(name, 0.0)) for name in joint_names])
+        fused.then_affine(np.arange(len(joint_names)), np.ones(len(joint_names)), offset)
+
+
+class HeadOffset(Offset):
+    def __init__(self, pitch=0.0, yaw=0.0, roll=0.0):
+        super().__init__({"HEAD_PITCH": pitch, "HEAD_YAW": yaw, "HEAD_ROLL": roll})
+
+
+class Clamp:
+    # limits_degrees maps joint name to (min, max); default applies to every other joint.
+    def __init__(self, limits_degrees=None, default=None):
+        self.limits_degrees = dict(limits_degrees or {})
+        self.default = default
+
+    def fuse_into(self, fused, joint_names):
+        lower = np.full(len(joint_names), float(INT32_MIN))
+        upper = np.full(len(joint_names), float(INT32_MAX))
+        for column, name in enumerate(joint_names):
+            limits = self.limits_degrees.get(name, self.default)
+            if limits is not None:
+                lower[column] = degrees_to_urad(limits[0])
+                upper[column] = degrees_to_urad(limits[1])
+        fused.then_clip(lower, upper)
+
+
+class Pipeline:
+    # Stages are any objects with fuse_into(fused, joint_names), applied in order.
+    def __init__(self, *stages):
+        self.stages = stages
+        self._compiled = {}
+
+    def compile(self, joints):
+        # Fused once per joint table; every motion sharing that table reuses it.
+        fused = self._compiled.get(joints.joint_names)
+        if fused is None:
+            fused = FusedTransform(len(joints))
+            for stage in self.stages:
+                stage.fuse_into(fused, joints.joint_names)
+            self._compiled[joints.joint_names] = fused
+        return fused
+
+    def apply(self, motion):
+        return self.compile(motion.joints).apply(motion)
+
+
+def generate_variants(motion, pipelines):
+    return {name: pipeline.apply(motion) for name, pipeline in pipelines.items()}
+
+def write_variants(filename, pipelines):
+    motion = read_motion(filename)
+    stem, extension = os.path.splitext(filename)
+    written = []
+    for name, variant in generate_variants(motion, pipelines).items():
+        variant_filename = f"{stem}_{name}{extension}"
+        write_motion(variant, variant_filename)
+        written.append(variant_filename)
+    return written
+
+
+if __name__ == "__main__":
+    filename = "S2S.mtn"  # Replace with your MTN file name
+    variants = {
+        "mirrored": Pipeline(Mirror()),
+        "slow": Pipeline(TimeScale(2.0)),
+        "fast": Pipeline(TimeScale(0.5)),
+        "mirrored_look_up": Pipeline(Mirror(), HeadOffset(pitch=10.0), Clamp({"HEAD_PITCH": (-75.0, 0.0)}))
+    }
+    print(f"Generating {len(variants)} variants of {filename}...")
+    for variant_filename in write_variants(filename, variants):
+        print(f"  Saved {variant_filename}")
+    print("Finished.")
@@ -0,0 +1,207 @@
+#Fast structural validator for MTN files.
+#Only the headers, string tables and PRM list are read; keyframe payloads are checked by arithmetic
+#against the file length, so every file of a corpus can be screened before it reaches the converters.
+#Made with <3 by Doggies Galore
+
+import os
+import shutil
+import struct
+import sys
+from enum import IntEnum
+
+from AIBOMotionModel import (
+    BLOCK0_FORMAT, BLOCK_HEADER_FORMAT, JOINTS_MAP, KEYFRAME_HEADER_FORMAT, PLATFORM_MAP, SIGNATURE
+)
+
+BLOCK0_SIZE = struct.calcsize(BLOCK0_FORMAT)
+BLOCK_HEADER_SIZE = struct.calcsize(BLOCK_HEADER_FORMAT)
+KEYFRAME_HEADER_SIZE = struct.calcsize(KEYFRAME_HEADER_FORMAT)
+MIN_SECTIONS = 4
+
+
+class MTNError(IntEnum):
+    FILE_TOO_SHORT = 1
+    SIGNATURE_MISMATCH = 2
+    BAD_BLOCK0_SIZE = 3
+    TOO_FEW_SECTIONS = 4
+    BLOCK_HEADER_TRUNCATED = 5
+    BAD_BLOCK_NUMBER = 6
+    BLOCK_LENGTH_OUT_OF_BOUNDS = 7
+    STRING_OUT_OF_BOUNDS = 8
+    UNKNOWN_PLATFORM = 9
+    BAD_JOINT_COUNT = 10
+    PRM_MISSING_PREFIX = 11
+    UNKNOWN_PRM_CODE = 12
+    KEYFRAME_PAYLOAD_TRUNCATED = 13
+    STRING_NOT_UTF8 = 14
+
+# Signature mismatches are common in AIBOWare with different headers and the parsers cope with
+# unknown PRM codes, so these are reported without rejecting the file.
+WARNING_CODES = frozenset((MTNError.SIGNATURE_MISMATCH, MTNError.UNKNOWN_PRM_CODE))
+
+
+class ValidationResult:
+    __slots__ = ("filename", "issues")
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.issues = []
+
+    def add(self, code, message):
+        self.issues.append((code, message))
+
+    @property
+    def errors(self):
+        return [issue for issue in self.issues if issue[0] not in WARNING_CODES]
+
+    @property
+    def warnings(self):
+        return [issue for issue in self.issues if issue[0] in WARNING_CODES]
+
+    @property
+    def is_valid(self):
+        return not self.errors
+
+    def format_report(self):
+        lines = [f"{self.filename}: {'valid' if self.is_valid else 'INVALID'}"]
+        for code, message in self.issues:
+            level = "warning" if code in WARNING_CODES else "error"
+            lines.append(f"  {level} {code.name}: {message}")
+        return "\n".join(lines)
+
+
+def _read_strings(payload, count, result, block_num, strict_from=0):
+    # Length-prefixed strings packed back to back; stops at the first one that runs past the block.
+    # Strings from strict_from on must be valid UTF-8 (the platform name and PRM codes); chunk and
+    # author names are free text and only decoded leniently, like the converters do.
+    strings = []
+    position = 0
+    for string_index in range(count):
+        if position >= len(payload):
+            result.add(MTNError.STRING_OUT_OF_BOUNDS, f"Block{block_num} string {string_index + 1} starts past the block end")
+            return None
+        length = payload[position]
+        end = position + 1 + length
+        if end > len(payload):
+            result.add(MTNError.STRING_OUT_OF_BOUNDS,
+                       f"Block{block_num} string {string_index + 1} needs {length} bytes, {len(payload) - position - 1} left")
+            return None
+        try:
+            strings.append(payload[position + 1:end].decode("utf-8", errors='strict' if string_index >= strict_from else 'ignore'))
+        except UnicodeDecodeError as error:
+            result.add(MTNError.STRING_NOT_UTF8, f"Block{block_num} string {string_index + 1} is not UTF-8: {error.reason} at byte {error.start}")
+            return None
+        position = end
+    return strings
+
+def validate_mtn_file(filename):
+    result = ValidationResult(filename)
+    file_size = os.path.getsize(filename)
+
+    with open(filename, "rb") as f:
+        if file_size < len(SIGNATURE) + BLOCK0_SIZE:
+            result.add(MTNError.FILE_TOO_SHORT, f"{file_size} bytes is shorter than the signature and Block0")
+            return result
+
+        signature = f.read(len(SIGNATURE))
+        if signature != SIGNATURE:
+            result.add(MTNError.SIGNATURE_MISMATCH, f"signature {signature!r}")
+
+        block_num, block_size, num_sections, major_ver, minor_ver, tile_count, frame_rate, options = struct.unpack(
+            BLOCK0_FORMAT, f.read(BLOCK0_SIZE))
+        if block_size != BLOCK0_SIZE:
+            result.add(MTNError.BAD_BLOCK0_SIZE, f"Block0 size {block_size}, expected {BLOCK0_SIZE}")
+        if num_sections < MIN_SECTIONS:
+            result.add(MTNError.TOO_FEW_SECTIONS, f"{num_sections} sections, expected at least {MIN_SECTIONS}")
+            return result
+
+        ers_format_name = None
+        num_joints = None
+        current_offset = len(SIGNATURE) + BLOCK0_SIZE
+        for block_index in range(1, num_sections):
+            if current_offset + BLOCK_HEADER_SIZE > file_size:
+                result.add(MTNError.BLOCK_HEADER_TRUNCATED, f"Block{block_index} header at offset {current_offset} is past the end of the file")
+                return result
+            f.seek(current_offset)
+            block_num, block_len = struct.unpack(BLOCK_HEADER_FORMAT, f.read(BLOCK_HEADER_SIZE))
+            if block_num != block_index:
+                result.add(MTNError.BAD_BLOCK_NUMBER, f"block at offset {current_offset} is numbered {block_num}, expected {block_index}")
+            if block_len < BLOCK_HEADER_SIZE or current_offset + block_len > file_size:
+                result.add(MTNError.BLOCK_LENGTH_OUT_OF_BOUNDS,
+                           f"Block{block_index} length {block_len} at offset {current_offset} doesn't fit in {file_size} bytes")
+                return result
+            payload_len = block_len - BLOCK_HEADER_SIZE
+
+            if block_index == 1:
+                strings = _read_strings(f.read(payload_len), 3, result, block_index, strict_from=2)
+                if strings is None:
+                    return result
+                ers_format_name = PLATFORM_MAP.get(strings[2], strings[2])
+                if ers_format_name not in JOINTS_MAP:
+                    result.add(MTNError.UNKNOWN_PLATFORM, f"platform {strings[2]!r} is not in joints.json")
+                    return result
+
+            elif block_index == 2:
+                payload = f.read(payload_len)
+                if len(payload) < 2:
+                    result.add(MTNError.STRING_OUT_OF_BOUNDS, "Block2 is too short for the joint count")
+                    return result
+                num_joints = struct.unpack("<H", payload[:2])[0]
+                if num_joints == 0 or num_joints > len(JOINTS_MAP[ers_format_name]):
+                    result.add(MTNError.BAD_JOINT_COUNT,
+                               f"{num_joints} joints, {ers_format_name} has {len(JOINTS_MAP[ers_format_name])}")
+                    return result
+                prm_strings = _read_strings(payload[2:], num_joints, result, block_index)
+                if prm_strings is None:
+                    return result
+                for joint_index, prm_string in enumerate(prm_strings):
+                    prm_split = prm_string.split("PRM:")
+                    if len(prm_split) < 2:
+                        result.add(MTNError.PRM_MISSING_PREFIX, f"joint {joint_index + 1} {prm_string!r} has no PRM: prefix")
+                    elif "PRM:" + prm_split[1] not in JOINTS_MAP[ers_format_name]:
+                        result.add(MTNError.UNKNOWN_PRM_CODE, f"joint {joint_index + 1} {prm_string!r} is not in joints.json for {ers_format_name}")
+
+            elif block_index == 3:
+                keyframe_size = KEYFRAME_HEADER_SIZE + 4 * num_joints
+                if tile_count * keyframe_size > payload_len:
+                    result.add(MTNError.KEYFRAME_PAYLOAD_TRUNCATED,
+                               f"{tile_count} keyframes x {keyframe_size} bytes needs {tile_count * keyframe_size}, Block3 holds {payload_len}")
+
+            current_offset += block_len
+
+    return result
+
+def quarantine_file(filename, quarantine_dir):
+    os.makedirs(quarantine_dir, exist_ok=True)
+    destination = os.path.join(quarantine_dir, os.path.basename(filename))
+    shutil.move(filename, destination)
+    return destination
+
+def validate_directory(directory, quarantine_dir=None):
+    results = []
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith(".mtn"):
+            continue
+        result = validate_mtn_file(os.path.join(directory, name))
+        if not result.is_valid and quarantine_dir is not None:
+            destination = quarantine_file(result.filename, quarantine_dir)
+            with open(destination + ".txt", "w") as report_file:
+                report_file.write(result.format_report() + "\n")
+        results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    target = sys.argv[1] if len(sys.argv) > 1 else "S2S.mtn"
+    if os.path.isdir(target):
+        quarantine_dir = sys.argv[2] if len(sys.argv) > 2 else os.path.join(target, "quarantine")
+        results = validate_directory(target, quarantine_dir)
+        for result in results:
+            if result.issues:
+                print(result.format_report())
+        invalid = sum(not result.is_valid for result in results)
+        print(f"Validated {len(results)} files: {len(results) - invalid} valid, {invalid} quarantined to {quarantine_dir}")
+    else:
+        result = validate_mtn_file(target)
+        print(result.format_report())
+        sys.exit(0 if result.is_valid else 1)
@@ -5,13 +5,16 @@
 import struct
 import json
 
+from AIBOMotionBundle import REFERENCE
+from AIBOMotionModel import Motion, get_joint_table, read_keyframe_block
+
 # Define constants based on the updated specifications
 SIGNATURE = b"OMTN"
 
 # Format strings for parsing Block0, the header, and keyframes
 BLOCK0_FORMAT = "<IIIHHHHI"
 BLOCK_HEADER_FORMAT = "<II"  
-KEYFRAME_HEADER_FORMAT = "<HHII"
+KEYFRAME_HEADER_FORMAT = "<HHIII"
 
 # DRX to ERS model mapping
 PLATFORM_MAP = {
@@ -22,9 +25,8 @@ PLATFORM_MAP = {
     "DRX-1000": "ERS-7"
 }
 
-# joint PRM to movement names are stored in a JSON dict.
-with open('joints.json', 'r') as f:
-    JOINTS_MAP = json.load(f)
+# joint PRM to movement names come from the compiled reference bundle (built from joints.json).
+JOINTS_MAP = REFERENCE.joints_map
 
 def read_variable_length_string(f):
     length_byte = struct.unpack("B", f.read(1))[0]
@@ -123,40 +125,25 @@ def parse_mtn_file(filename):
 
             elif block_index == 3:
                 print("  Keyframes:")
-                for keyframe_index in range(tile_count):
-                    keyframe_header = f.read(struct.calcsize(KEYFRAME_HEADER_FORMAT))
-                    if not keyframe_header:
-                        break
-                    time_delta, dummy1, dummy2, dummy3 = struct.unpack(KEYFRAME_HEADER_FORMAT, keyframe_header)
-                    
-                    time_msecs = (time_delta + 1) * frame_rate
-                    joint_positions = []
-                    for joint_index in range(num_joints):
-                        angle_uradians = struct.unpack("<i", f.read(4))[0]
-                        angle_degrees = angle_uradians * 180.0 / (1000000.0 * 3.141592654)
-                        joint_name = JOINTS_MAP[ers_format_name].get(prm_codes[joint_index], f"Unknown joint {joint_index + 1}")
-                        joint_data = {
-                            "JointName": joint_name,
-                            "Angle_urad": angle_uradians,
-                            "Angle_degrees": angle_degrees
-                        }
-                        joint_positions.append(joint_data)
+                headers, angles_urad = read_keyframe_block(f, tile_count, num_joints)
+                keyframes = Motion(get_joint_table(ers_format_name, prm_codes), headers, angles_urad)
 
+                for keyframe in keyframes:
                     # Add formatted pose data
                     pose_name = ""
-                    if keyframe_index == 0:
+                    if keyframe.index == 0:
                         pose_name = "Sleep"
-                    elif keyframe_index == 1:
+                    elif keyframe.index == 1:
                         pose_name = "Sit"
-                    elif keyframe_index == 2:
+                    elif keyframe.index == 2:
                         pose_name = "Stand"
-                    
+
                     pose_data = {
                         "Pose": pose_name,
-                        "JointPositions": joint_positions
+                        "JointPositions": keyframe.to_joint_positions()
                     }
                     poses.append(pose_data)
-                    print(f"    Saved pose '{pose_name}' from keyframe {keyframe_index + 1}")
+                    print(f"    Saved pose '{pose_name}' from keyframe {keyframe.index + 1}")
 
             current_offset += block_len
             f.seek(current_offset)
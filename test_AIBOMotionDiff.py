@@ -0,0 +1,30 @@
+import shutil
+
+import AIBOMotionMatcher
+from AIBOMotionDiff import diff_files
+
+
+def test_matcher_output_diffs_against_known_good(tmp_path):
+    shutil.copy("S2S.mtn", tmp_path / "S2S.mtn")
+    AIBOMotionMatcher.convert_mtn_file(str(tmp_path / "S2S.mtn"), "ERS-7")
+
+    diff = diff_files("KnownGoodERS7.mtn", str(tmp_path / "S2S_converted.mtn"))
+
+    assert diff.structural_differences == []
+    assert len(diff.joint_names) == 20
+    assert diff.warnings == [
+        "golden Block1 length field says 44 bytes, the block holds 52",
+        "golden chunk name length byte says 16 bytes, the name is 24"
+    ]
+
+
+def test_truncated_keyframes_are_refused(tmp_path):
+    data = open("S2S.mtn", "rb").read()
+    (tmp_path / "S2S_short.mtn").write_bytes(data[:-40])
+
+    diff = diff_files("S2S.mtn", str(tmp_path / "S2S_short.mtn"))
+
+    assert not diff.is_match
+    assert diff.structural_differences == [
+        "candidate keyframes can't be parsed (0 of 2 keyframes of 20 joints read)"
+    ]
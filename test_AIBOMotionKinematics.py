@@ -0,0 +1,46 @@
+import numpy as np
+
+from AIBOMotionKinematics import LEGS, batch_forward_kinematics, feet_on_ground, rotate, rotation_x, rotation_y
+from AIBOMotionModel import KEYFRAME_HEADER_DTYPE, Motion, load_pose_library, read_motion
+
+SIT = 1
+
+
+def feet(positions, keyframe):
+    return np.array([positions[f"{leg}_FOOT"][keyframe] for leg in LEGS])
+
+
+def test_s2s_sit_is_grounded_and_pitched():
+    positions = batch_forward_kinematics([read_motion("S2S.mtn")])[0]
+    sit_feet = feet(positions, SIT)
+
+    assert feet_on_ground(positions).tolist() == [True, True]
+    # Front paws on straight legs, back paws folded under the hips: the body is pitched nose-up.
+    assert (sit_feet[:, 2] < 0).all()
+    front_z, back_z = sit_feet[:2, 2].mean(), sit_feet[2:, 2].mean()
+    assert front_z < back_z - 50
+
+
+def test_lifted_paw_is_not_grounded():
+    motion = read_motion("S2S.mtn")
+    angles = motion.angles_urad.copy()
+    # Swing the front left leg forward in the Sit keyframe.
+    angles[SIT, motion.joints.index["FL_LEG_VERT"]] -= 600000
+    lifted = Motion(motion.joints, motion.headers, angles)
+
+    assert feet_on_ground(batch_forward_kinematics([lifted])[0]).tolist() == [True, False]
+
+
+def test_rigid_pitch_and_roll_stay_grounded():
+    poses = load_pose_library("ERS-210")
+    motion = Motion(poses.joints, np.zeros(len(poses), dtype=KEYFRAME_HEADER_DTYPE), poses.angles_urad)
+    positions = batch_forward_kinematics([motion])[0]
+    assert feet_on_ground(positions).all()
+
+    for rotation in (rotation_y, rotation_x):
+        turned = rotation(np.full(len(poses), 0.4))
+        tilted = {name: rotate(turned, points) for name, points in positions.items()}
+        assert feet_on_ground(tilted).all()
+
+    upside_down = {name: points * np.array([1.0, 1.0, -1.0]) for name, points in positions.items()}
+    assert not feet_on_ground(upside_down).any()
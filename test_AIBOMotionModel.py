@@ -0,0 +1,70 @@
+import numpy as np
+
+from AIBOMotionModel import read_keyframe_block, read_motion, write_motion
+from AIBOMotionTransform import Mirror, Pipeline, TimeScale
+
+# Both files hold 2 keyframes of 20 joints: Block3 starts at offset 584 and is 8 + 2 x (16 + 4 x 20) bytes.
+BLOCK3_OFFSET = 584
+
+
+def test_s2s_time_deltas_and_angles():
+    motion = read_motion("S2S.mtn")
+
+    assert motion.time_deltas.tolist() == [0, 39]
+    assert motion.block_lengths[-1] == 8 + 2 * (16 + 4 * 20)
+    # Sleep -> Sit: symmetric legs, tail at rest.
+    degrees = np.rint(motion.degrees()).astype(int)
+    assert degrees[0].tolist() == [-10, 0, 0, -3, 0, 0, 60, 0, 30, -115, 0, 145, 60, 0, 30, -115, 0, 145, 0, 0]
+    assert degrees[1].tolist() == [-25, 0, 0, -3, 0, 0, 0, 0, 10, -90, 0, 135, 0, 0, 10, -90, 0, 135, 0, 0]
+
+
+def test_known_good_ers7_time_deltas():
+    with open("KnownGoodERS7.mtn", "rb") as f:
+        f.seek(BLOCK3_OFFSET + 8)
+        headers, angles = read_keyframe_block(f, 2, 20)
+
+    assert headers["time_delta"].tolist() == [0, 124]
+    assert np.rint(angles[1] * 180.0 / (1000000.0 * 3.141592654)).astype(int).tolist() == [
+        -40, 0, 5, -5, 0, 0, -25, -4, 20, -78, 20, 110, -25, -4, 20, -78, 20, 110, 5, 0
+    ]
+
+
+def test_read_motion_recovers_known_good_ers7_headers():
+    # Block1 declares 44 bytes and a 16-byte chunk name, but holds 52 bytes and a 24-byte name.
+    motion = read_motion("KnownGoodERS7.mtn")
+
+    assert motion.chunk_name == "a_sleep#sit_Sleep_To_Sit"
+    assert motion.format_name == "DRX-1000"
+    assert motion.model == "ERS-7"
+    assert motion.block_lengths == [52, 504, 200]
+    assert motion.time_deltas.tolist() == [0, 124]
+    assert motion.warnings == [
+        "Block1 length field says 44 bytes, the block holds 52",
+        "chunk name length byte says 16 bytes, the name is 24"
+    ]
+
+
+def test_write_motion_round_trip(tmp_path):
+    output = tmp_path / "S2S_copy.mtn"
+    write_motion(read_motion("S2S.mtn"), str(output))
+
+    with open("S2S.mtn", "rb") as original:
+        assert output.read_bytes() == original.read()
+
+
+def test_time_scale_only_touches_time_deltas(tmp_path):
+    motion = read_motion("S2S.mtn")
+    output = tmp_path / "S2S_slow.mtn"
+    write_motion(Pipeline(TimeScale(2.0)).apply(motion), str(output))
+    slow = read_motion(str(output))
+
+    assert slow.time_deltas.tolist() == [1, 79]
+    assert np.array_equal(slow.angles_urad, motion.angles_urad)
+
+
+def test_mirror_swaps_legs_not_header_bytes():
+    motion = read_motion("S2S.mtn")
+    mirrored = Pipeline(Mirror(), Mirror()).apply(motion)
+
+    assert np.array_equal(mirrored.angles_urad, motion.angles_urad)
+    assert np.array_equal(mirrored.headers, motion.headers)
@@ -0,0 +1,30 @@
+import shutil
+
+import AIBOMotionPoseDiscovery
+from AIBOMotionPoseDiscovery import discover_poses
+
+
+def test_files_are_parsed_once_and_other_models_are_not_validated(tmp_path, monkeypatch):
+    shutil.copy("S2S.mtn", tmp_path / "S2S.mtn")
+    shutil.copy("S2S.mtn", tmp_path / "S2S_copy.mtn")
+    validated = []
+    parsed = []
+
+    def recording(calls, function):
+        def record(filename):
+            calls.append(filename)
+            return function(filename)
+        return record
+
+    monkeypatch.setattr(AIBOMotionPoseDiscovery, "validate_mtn_file",
+                        recording(validated, AIBOMotionPoseDiscovery.validate_mtn_file))
+    monkeypatch.setattr(AIBOMotionPoseDiscovery, "read_motion", recording(parsed, AIBOMotionPoseDiscovery.read_motion))
+    filenames = [str(tmp_path / "S2S.mtn"), str(tmp_path / "S2S_copy.mtn")]
+
+    # S2S.mtn is an ERS-210 motion: nothing to validate or parse for ERS-7.
+    assert discover_poses(filenames, "ERS-7", num_clusters=2, epochs=3) == {"Poses": []}
+    assert validated == [] and parsed == []
+
+    poses = discover_poses(filenames, "ERS-210", num_clusters=2, epochs=3)["Poses"]
+    assert sorted(validated) == sorted(filenames) and sorted(parsed) == sorted(filenames)
+    assert sum(pose["KeyframeCount"] for pose in poses) == 4
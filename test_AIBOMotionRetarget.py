@@ -0,0 +1,25 @@
+import numpy as np
+
+from AIBOMotionModel import load_pose_library
+from AIBOMotionRetarget import get_retarget_model
+from AIBOMotionTransform import degrees_to_urad
+
+
+def test_out_of_range_pose_is_clamped_to_target_library():
+    source = load_pose_library("ERS-210")
+    target = load_pose_library("ERS-7")
+    # Sit with the head pitched and the front knees bent far past anything in either library.
+    pose = source.angles_urad[source.names.index("Sit")].copy()
+    for name, angle_degrees in (("HEAD_PITCH", -80.0), ("FL_LEG_KNEE", 170.0), ("FR_LEG_KNEE", 170.0)):
+        pose[source.joints.index[name]] = degrees_to_urad(angle_degrees)
+
+    retargeted = get_retarget_model("ERS-210", "ERS-7").apply(pose[None, :], source.joints)[0]
+
+    for name in ("HEAD_PITCH", "FL_LEG_KNEE", "FR_LEG_KNEE", "BL_LEG_KNEE", "TAIL_VERT"):
+        observed = target.angles_urad[:, target.joints.index[name]]
+        angle = retargeted[source.joints.index[name]]
+        assert observed.min() <= angle <= observed.max(), name
+    assert retargeted[source.joints.index["HEAD_PITCH"]] == target.angles_urad[:, target.joints.index["HEAD_PITCH"]].min()
+    assert retargeted[source.joints.index["FL_LEG_KNEE"]] == target.angles_urad[:, target.joints.index["FL_LEG_KNEE"]].max()
+    # Joints with no counterpart in the target (HEAD_ROLL) pass through.
+    assert retargeted[source.joints.index["HEAD_ROLL"]] == pose[source.joints.index["HEAD_ROLL"]]
@@ -0,0 +1,50 @@
+import numpy as np
+
+from AIBOMotionModel import KEYFRAME_HEADER_DTYPE, DEGREES_PER_URAD, Motion, get_named_joint_table
+from AIBOMotionSegment import _anchored_starts, segment_holds
+
+
+def make_motion(angles_degrees):
+    angles_degrees = np.asarray(angles_degrees, dtype=np.float64)
+    joints = get_named_joint_table("ERS-7", ("HEAD_PITCH", "HEAD_YAW"))
+    headers = np.zeros(len(angles_degrees), dtype=KEYFRAME_HEADER_DTYPE)
+    return Motion(joints, headers, np.rint(angles_degrees / DEGREES_PER_URAD))
+
+
+def test_slow_sweep_is_not_one_hold():
+    # 100 keyframes sweeping 40 degrees in 0.4 degree steps, each step under the tolerance.
+    sweep = np.arange(100) * 0.4
+    motion = make_motion(np.stack([sweep, np.zeros(100)], axis=1))
+    segments = segment_holds(motion, tolerance_degrees=0.5)
+
+    assert segments.lengths.sum() == 100
+    assert len(segments) == 50
+    for start, end in zip(segments.starts.tolist(), segments.ends.tolist()):
+        assert np.abs(sweep[start:end] - sweep[start]).max() <= 0.5
+
+
+def test_holds_and_moves():
+    angles = [[0, 0]] * 3 + [[10, 0], [20, 5]] + [[30, 5]] * 40
+    segments = segment_holds(make_motion(angles), tolerance_degrees=0.5)
+
+    assert segments.starts.tolist() == [0, 3, 4, 5]
+    assert segments.lengths.tolist() == [3, 1, 1, 40]
+    assert segments.is_hold.tolist() == [True, False, False, True]
+
+
+def test_jitter_within_tolerance_stays_one_hold():
+    jitter = np.tile([0.0, 0.3, -0.3, 0.2], 25)
+    segments = segment_holds(make_motion(np.stack([jitter, jitter], axis=1)), tolerance_degrees=0.5)
+
+    assert segments.lengths.tolist() == [100]
+
+
+def test_exact_holds_match_anchored_scan():
+    # Tolerance 0 takes the np.diff path; it must split exactly where the anchored scan does.
+    rng = np.random.default_rng(0)
+    angles = np.repeat(rng.integers(-3, 3, size=(500, 2)), rng.integers(1, 5, size=500), axis=0)
+    motion = make_motion(angles)
+    segments = segment_holds(motion)
+
+    assert segments.starts.tolist() == _anchored_starts(motion.angles_urad.astype(np.int64), 0, 16).tolist()
+    assert segments.lengths.sum() == len(motion)
@@ -0,0 +1,34 @@
+import os
+import shutil
+import stat
+
+import AIBOMotionHeaderCorrect
+import AIBOMotionMatcher
+from AIBOMotionValidate import MTNError, validate_mtn_file
+
+
+def converted_copy(tmp_path, converter):
+    source = tmp_path / "S2S.mtn"
+    shutil.copy("S2S.mtn", source)
+    converter.convert_mtn_file(str(source), "ERS-7")
+    return tmp_path / "S2S_converted.mtn"
+
+
+def test_converter_outputs_validate(tmp_path):
+    umask = os.umask(0o022)
+    os.umask(umask)
+    for converter in (AIBOMotionMatcher, AIBOMotionHeaderCorrect):
+        converted = converted_copy(tmp_path, converter)
+
+        assert validate_mtn_file(str(converted)).is_valid
+        assert stat.S_IMODE(converted.stat().st_mode) == 0o666 & ~umask
+
+
+def test_non_utf8_prm_code_is_rejected_before_writing(tmp_path):
+    data = bytearray(open("S2S.mtn", "rb").read())
+    data[data.index(b"PRM:") + 4] = 0xff
+    (tmp_path / "S2S.mtn").write_bytes(bytes(data))
+
+    assert [code for code, _ in validate_mtn_file(str(tmp_path / "S2S.mtn")).errors] == [MTNError.STRING_NOT_UTF8]
+    AIBOMotionMatcher.convert_mtn_file(str(tmp_path / "S2S.mtn"), "ERS-7")
+    assert not (tmp_path / "S2S_converted.mtn").exists()